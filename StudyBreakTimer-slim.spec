@@ -0,0 +1,128 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Slim build: only the parts of pygame the mixer needs, UPX off unless asked
+# for, and an optional one-folder layout that needs no extraction at launch.
+#
+#   pyinstaller --noconfirm StudyBreakTimer-slim.spec
+#
+# Environment:
+#   STUDYTIMER_ONEDIR=1  build dist/StudyBreakTimer/ instead of a single exe
+#   STUDYTIMER_UPX=1     compress binaries with UPX (upx must be on PATH)
+#
+# The icons ship packed in assets.bin (see assets.py), rebuilt on every build.
+# bench/build_profiles.py builds and times every profile.
+import os
+import sys
+
+sys.path.insert(0, SPECPATH)
+import assets
+
+ONEDIR = os.environ.get("STUDYTIMER_ONEDIR") == "1"
+UPX = os.environ.get("STUDYTIMER_UPX") == "1"
+
+# pygame imports these only inside try/except, and the app never uses them.
+PYGAME_EXCLUDES = [
+    'pygame.camera', 'pygame._camera_opencv', 'pygame._camera_vidcapture',
+    'pygame.docs', 'pygame.draw', 'pygame.examples', 'pygame.fastevent',
+    'pygame.font', 'pygame.freetype', 'pygame._freetype', 'pygame.ftfont',
+    'pygame.image', 'pygame.imageext', 'pygame.joystick', 'pygame.mask',
+    'pygame.midi', 'pygame.pypm', 'pygame.pixelarray', 'pygame.pixelcopy',
+    'pygame.scrap', 'pygame.sndarray', 'pygame.sprite', 'pygame.surfarray',
+    'pygame.sysfont', 'pygame.tests', 'pygame.threads', 'pygame.transform',
+    'pygame._sdl2.controller', 'pygame._sdl2.touch', 'pygame._sdl2.video',
+]
+STDLIB_EXCLUDES = [
+    'doctest', 'lib2to3', 'pdb', 'pydoc', 'test', 'tkinter.test', 'unittest',
+    'xmlrpc', 'pkg_resources', 'setuptools', 'distutils',
+]
+# Libraries behind the excluded modules (fonts, images, MIDI, tracker music).
+DROP_BINARIES = ('SDL2_image', 'SDL2_ttf', 'freetype', 'libjpeg', 'libpng', 'libtiff',
+                 'libwebp', 'libmodplug', 'portmidi')
+DROP_DATAS = ('freesansbold.ttf', 'pygame/examples', 'pygame/tests', 'pygame/docs')
+
+ASSET_WARNING = assets.build(SPECPATH, os.path.join(SPECPATH, assets.FILENAME))
+if ASSET_WARNING:
+    print(ASSET_WARNING)
+
+
+a = Analysis(
+    ['app.py'],
+    pathex=[],
+    binaries=[],
+    datas=[
+        (assets.FILENAME, '.'),
+        # Still read by the loudness and probe passes, and when the mixer's
+        # format differs from the pre-decoded copy.
+        ('default_sound.mp3', '.'),
+    ],
+    # zoneinfo has no system database on Windows; the data comes from tzdata.
+    hiddenimports=['tzdata'],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=PYGAME_EXCLUDES + STDLIB_EXCLUDES,
+    noarchive=False,
+    optimize=0,
+)
+
+
+def _keep(entry, drop):
+    name = entry[0].replace('\\', '/')
+    return not any(part in name for part in drop)
+
+
+a.binaries = [entry for entry in a.binaries if _keep(entry, DROP_BINARIES)]
+a.datas = [entry for entry in a.datas if _keep(entry, DROP_DATAS)]
+
+pyz = PYZ(a.pure)
+
+# The Tcl/Tk and Python runtime DLLs gain little from UPX and are slow to unpack.
+UPX_EXCLUDE = ['vcruntime140.dll', 'python3*.dll', 'tcl86t.dll', 'tk86t.dll']
+
+if ONEDIR:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='StudyBreakTimer',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=UPX,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=UPX,
+        upx_exclude=UPX_EXCLUDE,
+        name='StudyBreakTimer',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='StudyBreakTimer',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=UPX,
+        upx_exclude=UPX_EXCLUDE,
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
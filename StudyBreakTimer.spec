@@ -12,7 +12,8 @@ a = Analysis(
         ('mute.png', '.'),
         ('default_sound.mp3', '.'),
     ],
-    hiddenimports=[],
+    # zoneinfo has no system database on Windows; the data comes from tzdata.
+    hiddenimports=['tzdata'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,56 +1,217 @@
+import time
+# Taken before any other import, for --startup-report.
+LAUNCHED = time.time()
+
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from threading import Thread
-import time
-import pygame
+from threading import Event, Thread
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import os
 import sys
-
-class ToolTip:
-    def __init__(self, widget, text):
-        self.widget = widget
-        self.text = text
-        self.tipwindow = None
+import math
+import argparse
+import json
+import multiprocessing
+
+from engine import PhaseEngine, BREAK, LONG_BREAK
+from schedule import compile_plan, simple_plan, PlanError
+from instrumentation import UiMonitor
+import tracing
+import metrics
+from group import GroupLeader, GroupFollower, DEFAULT_PORT, parse_address
+from recurring import RecurringIndex, RecurringRunner, load_rules
+from calendars import CalendarSet
+from hooks import HookRunner
+import events
+from audio import create_backend, AudioError, BACKENDS
+from audio_process import ProcessBackend
+import tones
+from loudness import LoudnessCache
+from probe import Prober, ProbeResult
+from playlist import BreakPlaylist, load_tracks
+from mixing import AlarmCoalescer
+import library
+import thumbnails
+import assets
+
+class ToolTipManager:
+    """ One tooltip window shared by every widget in the application.
+
+    Widgets get a shared "ToolTip" bind tag instead of their own bindings, so
+    a single hover timer and a single withdrawn Toplevel serve them all.
+    """
+
+    def __init__(self, root, delay=500):
+        self.root = root
+        self.delay = delay
+        self.texts = {}
+        self.current = None
         self.id = None
-        self.x = self.y = 0
-        widget.bind("<Enter>", self.enter)
-        widget.bind("<Leave>", self.leave)
-
-    def enter(self, event=None):
+        self.tipwindow = tw = tk.Toplevel(root)
+        tw.withdraw()
+        tw.wm_overrideredirect(True)
+        self.label = tk.Label(tw, justify=tk.LEFT,
+                              background="#ffffe0", relief=tk.SOLID, borderwidth=1,
+                              font=("tahoma", "8", "normal"))
+        self.label.pack(ipadx=1)
+        root.bind_class("ToolTip", "<Enter>", self.enter)
+        root.bind_class("ToolTip", "<Leave>", self.leave)
+        root.bind_class("ToolTip", "<ButtonPress>", self.leave)
+
+    def register(self, widget, text):
+        if widget not in self.texts:
+            widget.bindtags(widget.bindtags() + ("ToolTip",))
+        self.texts[widget] = text
+
+    def enter(self, event):
+        self.current = event.widget
         self.schedule()
 
     def leave(self, event=None):
+        self.current = None
         self.unschedule()
         self.hidetip()
 
     def schedule(self):
         self.unschedule()
-        self.id = self.widget.after(500, self.showtip)
+        self.id = self.root.after(self.delay, self.showtip)
 
     def unschedule(self):
         id = self.id
         self.id = None
         if id:
-            self.widget.after_cancel(id)
-
-    def showtip(self, event=None):
-        x = y = 0
-        x, y, _, _ = self.widget.bbox("insert")
-        x += self.widget.winfo_rootx() + 25
-        y += self.widget.winfo_rooty() + 25
-        self.tipwindow = tw = tk.Toplevel(self.widget)
-        tw.wm_overrideredirect(True)
+            self.root.after_cancel(id)
+
+    def showtip(self):
+        self.id = None
+        widget = self.current
+        if widget is None:
+            return
+        x = widget.winfo_rootx() + 25
+        y = widget.winfo_rooty() + widget.winfo_height()
+        self.label.config(text=self.texts[widget])
+        tw = self.tipwindow
         tw.wm_geometry(f"+{x}+{y}")
-        label = tk.Label(tw, text=self.text, justify=tk.LEFT,
-                         background="#ffffe0", relief=tk.SOLID, borderwidth=1,
-                         font=("tahoma", "8", "normal"))
-        label.pack(ipadx=1)
+        tw.deiconify()
+        tw.lift()
 
     def hidetip(self):
-        tw = self.tipwindow
-        self.tipwindow = None
-        if tw:
-            tw.destroy()
+        self.tipwindow.withdraw()
+
+# Milliseconds the alarm file path must stay unchanged before it is probed.
+PROBE_DELAY = 400
+
+class LibraryPicker:
+    """ Search-as-you-type window over the sound library. """
+
+    def __init__(self, root, library, on_pick):
+        self.library = library
+        self.on_pick = on_pick
+        self.results = []
+        self.window = top = tk.Toplevel(root)
+        top.title("Sound library")
+        top.transient(root)
+        self.query = tk.StringVar()
+        entry = tk.Entry(top, textvariable=self.query)
+        entry.pack(fill=tk.X)
+        frame = tk.Frame(top)
+        frame.pack(fill=tk.BOTH, expand=True)
+        scrollbar = tk.Scrollbar(frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = tk.Listbox(frame, width=50, height=15, yscrollcommand=scrollbar.set)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=self.listbox.yview)
+        self.waveform = tk.Canvas(top, height=48, width=thumbnails.WIDTH, background="white",
+                                  highlightthickness=0)
+        self.waveform.pack(fill=tk.X)
+        # Thumbnails missing from the cache are computed here, one at a time.
+        self.thumbnailer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnail")
+        self._thumbnail_job = None
+        self.status = tk.Label(top, anchor="w", font=("tahoma", "8", "normal"))
+        self.status.pack(fill=tk.X)
+
+        self.query.trace_add("write", lambda *_: self.refresh())
+        self.listbox.bind("<<ListboxSelect>>", lambda e: self.show_info())
+        self.listbox.bind("<Double-Button-1>", lambda e: self.pick())
+        entry.bind("<Return>", lambda e: self.pick())
+        entry.bind("<Down>", lambda e: self.move(1))
+        entry.bind("<Up>", lambda e: self.move(-1))
+        top.bind("<Escape>", lambda e: top.destroy())
+        top.bind("<Destroy>", lambda e: e.widget is top and self.thumbnailer.shutdown(wait=False,
+                                                                                   cancel_futures=True))
+        entry.focus_set()
+        self.refresh()
+
+    def set_library(self, library):
+        self.library = library
+        self.refresh()
+
+    def refresh(self):
+        self.results = self.library.search(self.query.get())
+        self.listbox.delete(0, tk.END)
+        for path in self.results:
+            self.listbox.insert(tk.END, os.path.basename(path))
+        if self.results:
+            self.listbox.selection_set(0)
+        self.show_info()
+
+    def move(self, step):
+        selection = self.listbox.curselection()
+        if not self.results:
+            return
+        index = min(max((selection[0] if selection else -1) + step, 0), len(self.results) - 1)
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+        self.show_info()
+
+    def selected(self):
+        selection = self.listbox.curselection()
+        return self.results[selection[0]] if selection else None
+
+    def show_info(self):
+        path = self.selected()
+        self.show_waveform(path)
+        if path is None:
+            self.status.config(text=f"{len(self.library)} sounds")
+            return
+        info = self.library.info(path)
+        if info.get("error"):
+            text = info["error"]
+        elif info.get("duration") is not None:
+            text = f"{info['duration']:.1f} s, {info['rate'] / 1000:g} kHz"
+        else:
+            text = "not scanned yet"
+        self.status.config(text=f"{os.path.dirname(path)}  -  {text}")
+
+    def show_waveform(self, path):
+        if self._thumbnail_job is not None:
+            self._thumbnail_job.cancel()
+            self._thumbnail_job = None
+        thumbnail = thumbnails.load(path) if path else None
+        thumbnails.draw(self.waveform, thumbnail)
+        if path and thumbnail is None and not self.library.info(path).get("error"):
+            job = self._thumbnail_job = self.thumbnailer.submit(thumbnails.render, path)
+            job.add_done_callback(lambda job: self.thumbnail_done(path, job))
+
+    def thumbnail_done(self, path, job):
+        try:
+            self.window.after(0, self.thumbnail_ready, path, job)
+        except (RuntimeError, tk.TclError):
+            # The picker was closed meanwhile.
+            pass
+
+    def thumbnail_ready(self, path, job):
+        if job.cancelled() or job.exception() is not None or path != self.selected():
+            return
+        thumbnails.draw(self.waveform, job.result())
+
+    def pick(self):
+        path = self.selected()
+        if path is not None:
+            self.on_pick(path)
+            self.window.destroy()
 
 def resource_path(relative_path):
     """ Get the absolute path to the resource, works for development and for PyInstaller bundled exe. """
@@ -63,17 +224,51 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 class StudyBreakTimer:
-    def __init__(self, root):
+    def __init__(self, root, monitor=None, trace_path=None, group=None, rules=None,
+                 calendars=None, hooks=None, bus=None, audio=None, audio_factory=None,
+                 loudness=None, library_dirs=None, break_playlist=None, alarm_window=1.0,
+                 clock=time.monotonic, sleep=time.sleep):
         self.root = root
         self.root.title("")
+        self.monitor = monitor or UiMonitor(root)
+        self.trace_path = trace_path
+        self.group = group
+        self.hooks = hooks
+        self.bus = bus or events.EventBus()
+        if hooks is not None:
+            hooks.attach(self.bus)
 
-        default_alarm_file = resource_path("default_sound.mp3")
+        def wrap(name, callback):
+            return self.monitor.wrap(name, tracing.wrap(name, callback))
+
+        default_alarm_file = self.default_alarm_file = resource_path("default_sound.mp3")
+        # Icons and the decoded default sound in one mapped file; see load_images.
+        self.assets = None
 
         self.study_minutes = tk.IntVar(value=25)
         self.break_minutes = tk.IntVar(value=10)
         self.alarm_file = tk.StringVar(value=default_alarm_file)
-
-        pygame.mixer.init()
+        self.plan_text = tk.StringVar()
+
+        # Startup comes in two phases: this constructor only builds the window,
+        # with placeholder text for the icons and every control that needs
+        # something not loaded yet disabled. The audio backend (importing
+        # pygame, opening the mixer), the icons and the saved library index and
+        # playlist then load on idle callbacks and background threads, and each
+        # enables its controls when it is ready.
+        self.pending = {"audio", "images", "settings"}
+        self.ready_at = None
+        self._ready_callbacks = []
+        self.closed = False
+        self.audio = None
+        # (path, mtime_ns, size) of the file the backend has decoded.
+        self.loaded_alarm = None
+        self.loudness = loudness
+        # Alarms that fire together ring once, with one combined notification.
+        self.alarms = AlarmCoalescer(self.sound_alarm, self.alarm_notified, window=alarm_window,
+                                     clock=clock, sleep=sleep)
+
+        self.tooltips = ToolTipManager(root)
 
         for i in range(4):
             root.grid_columnconfigure(i, weight=1)
@@ -86,102 +281,701 @@ class StudyBreakTimer:
         self.break_spinbox = tk.Spinbox(root, from_=5, to_=60, increment=5, textvariable=self.break_minutes)
         self.break_spinbox.grid(row=3, column=0, columnspan=4, sticky="ew")
 
-        tk.Label(root, text="Sound file path:").grid(row=4, column=0, columnspan=4, sticky="ew")
-        tk.Entry(root, textvariable=self.alarm_file).grid(row=5, column=0, columnspan=3, sticky="ew")
-
-        self.browse_image = tk.PhotoImage(file=resource_path("folder.png"))
-        self.play_image = tk.PhotoImage(file=resource_path("play.png"))
-        self.stop_image = tk.PhotoImage(file=resource_path("stop.png"))
-        self.mute_image = tk.PhotoImage(file=resource_path("mute.png"))
-
-        browse_button = tk.Button(root, image=self.browse_image, command=self.browse_file)
-        browse_button.grid(row=5, column=3, sticky="ew")
-        ToolTip(browse_button, "Browse for an alarm sound file")
-
-        self.start_button = tk.Button(root, image=self.play_image, command=self.start_timer)
-        self.start_button.grid(row=6, column=0, columnspan=2, sticky="ew")
-        ToolTip(self.start_button, "Start the study timer")
-
-        self.stop_timer_button = tk.Button(root, image=self.stop_image, command=self.stop_timer)
-        self.stop_timer_button.grid(row=6, column=2, columnspan=2, sticky="ew")
-        ToolTip(self.stop_timer_button, "Stop the study timer")
-
-        self.stop_sound_button = tk.Button(root, image=self.mute_image, command=self.stop_sound)
-        self.stop_sound_button.grid(row=7, column=0, columnspan=4, sticky="ew")
-        ToolTip(self.stop_sound_button, "Stop the alarm sound")
+        tk.Label(root, text="Plan (optional):").grid(row=4, column=0, columnspan=4, sticky="ew")
+        plan_entry = tk.Entry(root, textvariable=self.plan_text)
+        plan_entry.grid(row=5, column=0, columnspan=4, sticky="ew")
+        self.tooltips.register(plan_entry, "e.g. 4 x (50 study, 10 break), 30 long break; until 18:00")
+
+        tk.Label(root, text="Sound file path:").grid(row=6, column=0, columnspan=4, sticky="ew")
+        sound_entry = tk.Entry(root, textvariable=self.alarm_file)
+        sound_entry.grid(row=7, column=0, columnspan=2 if library_dirs else 3, sticky="ew")
+        self.tooltips.register(sound_entry, "A sound file, or a synthesized tone such as tone:chime, "
+                                            f"tone:880/150 0/80 880/150\nPresets: {', '.join(tones.PRESETS)}")
+
+        self.browse_button = tk.Button(root, text="...", command=wrap("browse_file", self.browse_file))
+        self.browse_button.grid(row=7, column=3, sticky="ew")
+        self.tooltips.register(self.browse_button, "Browse for an alarm sound file")
+
+        self.library_dirs = library_dirs
+        self.library = None
+        self.library_button = None
+        self.picker = None
+        if library_dirs:
+            self.library_button = tk.Button(root, text="Library", state=tk.DISABLED,
+                                            command=wrap("open_library", self.open_library))
+            self.library_button.grid(row=7, column=2, sticky="ew")
+            self.tooltips.register(self.library_button, "Search the sound library")
+
+        self.alarm_status = tk.Label(root, text="", anchor="w", font=("tahoma", "8", "normal"))
+        self.alarm_status.grid(row=8, column=0, columnspan=4, sticky="ew")
+
+        self.start_button = tk.Button(root, text="Start", state=tk.DISABLED,
+                                      command=wrap("start_timer", self.start_timer))
+        self.start_button.grid(row=9, column=0, columnspan=2, sticky="ew")
+        self.tooltips.register(self.start_button, "Start the study timer")
+
+        self.stop_timer_button = tk.Button(root, text="Stop", command=wrap("stop_timer", self.stop_timer))
+        self.stop_timer_button.grid(row=9, column=2, columnspan=2, sticky="ew")
+        self.tooltips.register(self.stop_timer_button, "Stop the study timer")
+
+        self.stop_sound_button = tk.Button(root, text="Mute", state=tk.DISABLED,
+                                           command=wrap("stop_sound", self.stop_sound))
+        self.stop_sound_button.grid(row=10, column=0, columnspan=4, sticky="ew")
+        self.tooltips.register(self.stop_sound_button, "Stop the alarm sound")
+
+        self.countdown_label = tk.Label(root, text="--:--", font=("tahoma", "16", "bold"))
+        self.countdown_label.grid(row=11, column=0, columnspan=4, sticky="ew")
+
+        for name, var in (("study_minutes", self.study_minutes), ("break_minutes", self.break_minutes),
+                          ("alarm_file", self.alarm_file), ("plan", self.plan_text)):
+            var.trace_add("write", lambda *_, name=name, var=var: self.settings_changed(name, var))
+        self.alarm_file.trace_add("write", lambda *_: self.alarm_file_changed())
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        # Redraw straight away when the window comes back from being minimized
+        self.root.bind("<Map>", self.on_map)
+        if self.trace_path:
+            self.root.bind("<Control-Shift-T>", self.dump_trace)
 
         self.running = False
+        # Set to stop the current worker thread. Every run gets its own, so a
+        # worker that has not noticed a stop yet cannot carry on with the
+        # next run after a quick stop and start.
+        self._stop = None
+        self.plan = None
+        # Busy periods from calendars pause the plan around them; the files
+        # are parsed with the other settings, see init_settings.
+        self.calendars = calendars
+        self.engine = PhaseEngine(clock=clock, sleep=sleep)
+        self.playlist = None
+        self.break_tracks = None
+        self._tick_id = None
+
+        # Alarm files are checked in the background as soon as they are chosen.
+        self.probe_result = None
+        self._probe_id = None
+        self.prober = Prober(lambda result: self.root.after(0, self.show_probe, result),
+                             warmers=[self.warm_loudness])
+        self.alarm_file_changed()
+
+        self.rules = rules
+        self.recurring = None
+
+        self.root.after_idle(self.load_images)
+        if audio is not None:
+            self.root.after_idle(self.audio_ready, audio)
+        else:
+            Thread(target=self.init_audio, args=(audio_factory or create_backend,),
+                   name="init-audio", daemon=True).start()
+        Thread(target=self.init_settings, args=(break_playlist,), name="init-settings", daemon=True).start()
+
+    def dependency_ready(self, name):
+        self.pending.discard(name)
+        if name in ("audio", "settings") and not self.pending & {"audio", "settings"}:
+            self.timer_ready()
+        if not self.pending and self.ready_at is None:
+            self.ready_at = time.time()
+            for callback in self._ready_callbacks:
+                callback()
+
+    def when_ready(self, callback):
+        """ Call ``callback`` on the Tk thread once every deferred dependency has loaded. """
+        if self.ready_at is not None:
+            callback()
+        else:
+            self._ready_callbacks.append(callback)
+
+    def post(self, callback, *args):
+        """ ``root.after(0, ...)`` from a worker thread; False if the window is gone. """
+        try:
+            self.root.after(0, callback, *args)
+            return True
+        except (RuntimeError, tk.TclError):
+            return False
+
+    def load_images(self):
+        if self.closed:
+            return
+        self.assets = assets.open_bundle(resource_path(assets.FILENAME))
+        self.browse_image = self.load_image("folder")
+        self.play_image = self.load_image("play")
+        self.stop_image = self.load_image("stop")
+        self.mute_image = self.load_image("mute")
+        for button, image in ((self.browse_button, self.browse_image), (self.start_button, self.play_image),
+                              (self.stop_timer_button, self.stop_image),
+                              (self.stop_sound_button, self.mute_image)):
+            button.config(image=image)
+        self.dependency_ready("images")
+
+    def init_audio(self, factory):
+        # Anything that escaped here would leave Start disabled for good.
+        warning = None
+        try:
+            audio = factory()
+        except Exception as e:
+            warning = f"{e}; falling back to pygame"
+            try:
+                audio = create_backend()
+            except Exception as e:
+                warning = f"Could not open audio: {e}; alarms will be silent"
+                audio = create_backend("null")
+        if not self.post(self.audio_ready, audio, warning):
+            audio.close()
+
+    def audio_ready(self, audio, warning=None):
+        if self.closed:
+            audio.close()
+            return
+        self.audio = audio
+        self.start_playlist()
+        self.stop_sound_button.config(state=tk.NORMAL)
+        if warning:
+            messagebox.showwarning("Warning", warning)
+        self.dependency_ready("audio")
+
+    def timer_ready(self):
+        # A session needs the audio and the calendars, and so do scheduled ones.
+        self.start_button.config(state=tk.NORMAL)
+        if self.rules:
+            self.recurring = RecurringRunner(
+                RecurringIndex(self.rules), lambda rule: self.root.after(0, self.start_scheduled, rule)).start()
+
+    def init_settings(self, break_playlist):
+        error = None
+        tracks = None
+        if break_playlist:
+            try:
+                tracks = load_tracks(break_playlist)
+            except OSError as e:
+                error = f"Could not load the break playlist: {e}"
+        busy = CalendarSet(self.calendars) if self.calendars else None
+        if busy is not None and busy.unresolved:
+            warning = (f"Calendar times in {', '.join(sorted(busy.unresolved))} are read as local time: "
+                       "no timezone database found; install the tzdata package")
+            error = f"{error}\n\n{warning}" if error else warning
+        # The last index answers searches while the folders are rescanned.
+        index = library.load() if self.library_dirs else None
+        if self.post(self.settings_ready, tracks, busy, index, error) and self.library_dirs:
+            self.scan_library()
+
+    def settings_ready(self, tracks, busy, index, error=None):
+        if self.closed:
+            return
+        self.engine.busy = busy
+        self.break_tracks = tracks
+        self.start_playlist()
+        if index is not None:
+            self.library = library.Library(index)
+            self.library_button.config(state=tk.NORMAL)
+        if error:
+            messagebox.showerror("Error", error)
+        self.dependency_ready("settings")
+
+    def start_playlist(self):
+        # Needs both the backend and the tracks, whichever loads last.
+        if self.playlist is None and self.break_tracks and self.audio is not None:
+            self.playlist = BreakPlaylist(self.audio, self.break_tracks, clock=self.engine.clock,
+                                          on_error=lambda message: self.post(self.playlist_failed, message))
+
+    def playlist_failed(self, message):
+        messagebox.showerror("Error", f"No break music can be played: {message}")
+
+    def settings_changed(self, name, var):
+        if self.bus.wants(events.SettingsChanged):
+            try:
+                value = var.get()
+            except tk.TclError:
+                # e.g. a Spinbox that is momentarily empty while typing
+                return
+            self.bus.publish(events.SettingsChanged(name, value))
 
     def browse_file(self):
         file_path = filedialog.askopenfilename(filetypes=[("Audio Files", "*.mp3 *.wav")])
         if file_path:
             self.alarm_file.set(file_path)
 
-    def start_timer(self):
-        if not self.alarm_file.get():
-            messagebox.showwarning("Warning", "Please select an alarm sound file.")
+    def alarm_file_changed(self):
+        # Typing into the entry changes the path on every key; probe once it settles.
+        if self._probe_id is not None:
+            self.root.after_cancel(self._probe_id)
+        self._probe_id = self.root.after(PROBE_DELAY, self.probe_alarm_file)
+
+    def probe_alarm_file(self):
+        self._probe_id = None
+        self.probe_result = None
+        alarm_file = self.alarm_file.get()
+        if not alarm_file:
+            self.alarm_status.config(text="", fg="black")
+        elif tones.is_tone(alarm_file):
+            try:
+                tones.check(alarm_file)
+            except tones.ToneError as e:
+                self.alarm_status.config(text=str(e), fg="red")
+            else:
+                self.alarm_status.config(text="Synthesized tone", fg="gray30")
+        elif alarm_file == self.default_alarm_file and self.assets is not None \
+                and assets.SOUND in self.assets:
+            # The bundled copy was decoded when the bundle was built; decoding
+            # the mp3 again here would undo what the bundle saves at startup.
+            meta = self.assets.meta(assets.SOUND)
+            rate, channels = meta["rate"], meta["channels"]
+            self.show_probe(ProbeResult(alarm_file, meta["size"] / (2 * channels * rate), rate, channels))
+        else:
+            self.alarm_status.config(text="Checking...", fg="gray30")
+            self.prober.request(alarm_file)
+
+    def show_probe(self, result):
+        if result.path != self.alarm_file.get():
+            return
+        self.probe_result = result
+        color = "red" if not result.ok else "darkorange3" if result.warning else "gray30"
+        self.alarm_status.config(text=result.describe(), fg=color)
+
+    def warm_loudness(self, result):
+        if self.loudness is not None:
+            self.loudness.store(result.path, result.level)
+
+    def scan_library(self):
+        try:
+            index = library.scan(self.library_dirs)
+        except (OSError, BrokenProcessPool):
+            return
+        self.post(self.library_scanned, library.Library(index))
+
+    def library_scanned(self, new_library):
+        self.library = new_library
+        if self.picker is not None and self.picker.window.winfo_exists():
+            self.picker.set_library(new_library)
+
+    def open_library(self):
+        if self.picker is not None and self.picker.window.winfo_exists():
+            self.picker.window.lift()
+            return
+        self.picker = LibraryPicker(self.root, self.library, self.alarm_file.set)
+
+    def start_scheduled(self, rule):
+        # A session that is already running wins over a scheduled one.
+        if not self.running:
+            self.start_timer(rule.plan or None, scheduled=rule.name)
+
+    def start_timer(self, plan_text=None, scheduled=None):
+        """ ``scheduled`` names the rule starting the session. Nobody may be
+        at the screen then, so nothing opens a dialog: a session that cannot
+        start says why in the alarm status, and a flagged alarm file is used
+        anyway. """
+        def refuse(message):
+            if scheduled is None:
+                messagebox.showwarning("Warning", message)
+            else:
+                self.alarm_status.config(text=f"Scheduled session {scheduled!r} not started: {message}",
+                                         fg="red")
+
+        alarm_file = self.alarm_file.get()
+        if not alarm_file:
+            refuse("Please select an alarm sound file.")
+            return
+        if tones.is_tone(alarm_file):
+            try:
+                tones.check(alarm_file)
+            except tones.ToneError as e:
+                refuse(str(e))
+                return
+        result = self.probe_result
+        if scheduled is None and result is not None and result.path == alarm_file and not result.ok:
+            if not messagebox.askyesno("Warning", f"The alarm sound may not play: {result.error}.\n"
+                                                  "Start anyway?"):
+                return
+        try:
+            self.plan = self.build_plan(plan_text)
+        except PlanError as e:
+            refuse(f"Invalid plan: {e}")
             return
         self.running = True
+        self._stop = stop = Event()
         self.start_button.config(state=tk.DISABLED)
-        Thread(target=self.run_timer).start()
+        Thread(target=self.run_timer, args=(stop,), name="timer").start()
+        self.schedule_tick()
 
     def stop_timer(self):
         self.running = False
-        self.start_button.config(state=tk.NORMAL)
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+        if not self.pending & {"audio", "settings"}:
+            self.start_button.config(state=tk.NORMAL)
+        if isinstance(self.group, GroupLeader):
+            self.group.stop()
+        self.engine.clear()
+        if self.playlist is not None:
+            self.playlist.stop()
+        self.cancel_tick()
+        self.bus.publish(events.TimerStopped())
+        self.draw_countdown()
 
     def stop_sound(self):
-        pygame.mixer.music.stop()
-
-    def run_timer(self):
-        study_seconds = self.study_minutes.get() * 60
-        break_seconds = self.break_minutes.get() * 60
-        alarm_file = self.alarm_file.get()
-
-        while self.running:
-            for _ in range(study_seconds):
-                if not self.running:
-                    return
-                time.sleep(1)
-            pygame.mixer.music.load(alarm_file)
-            pygame.mixer.music.play()
-
-            # Bring the window to the foreground and set focus on the mute button
+        if self.playlist is not None:
+            self.playlist.stop()
+        self.audio.stop()
+        self.bus.publish(events.AlarmStopped())
+
+    def schedule_tick(self):
+        # Wake up just after the remaining time crosses a whole second so the
+        # displayed value changes exactly once per second.
+        self.cancel_tick()
+        remaining = self.engine.remaining()
+        if remaining is None:
+            delay = 1000
+        else:
+            delay = int((remaining - math.floor(remaining)) * 1000) + 1
+        self._tick_id = self.root.after(delay, self.tick)
+
+    def cancel_tick(self):
+        if self._tick_id is not None:
+            self.root.after_cancel(self._tick_id)
+            self._tick_id = None
+
+    def tick(self):
+        self._tick_id = None
+        if self.root.state() not in ("iconic", "withdrawn"):
+            self.draw_countdown()
+        if self.running:
+            self.schedule_tick()
+
+    def on_map(self, event=None):
+        if event is None or event.widget is self.root:
+            self.draw_countdown()
+
+    def draw_countdown(self):
+        state = self.engine.state
+        if state is None:
+            self.countdown_label.config(text="--:--")
+            self.root.title("")
+            return
+        phase, deadline = state
+        seconds = math.ceil(max(0.0, deadline - self.engine.clock()))
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        if hours:
+            text = f"{hours}:{minutes:02d}:{seconds:02d}"
+        else:
+            text = f"{minutes:02d}:{seconds:02d}"
+        self.countdown_label.config(text=text)
+        self.root.title(f"{phase.capitalize()} {text}")
+
+    def raise_window(self):
+        # Bring the window to the foreground and set focus on the mute button
+        with self.monitor.time("raise_window"), tracing.span("raise_window", "alarm"):
             self.root.deiconify()
             self.root.lift()
             self.root.focus_force()
             self.root.wm_attributes("-topmost", 1)
             self.stop_sound_button.focus()
 
-            while pygame.mixer.music.get_busy() and self.running:
-                time.sleep(1)
-
-            if not self.running:
-                return
+    def play_alarm(self, alarm_file, reason=None):
+        self.alarms.fire(alarm_file, reason)
+
+    def alarm_notified(self, alarm_file, reasons):
+        self.bus.publish(events.AlarmStarted(alarm_file, reasons))
+
+    def sound_alarm(self, alarm_file):
+        tracing.instant("alarm", "alarm")
+        start = time.perf_counter()
+        try:
+            with tracing.span("audio.load", "alarm"):
+                play = self.load_alarm(alarm_file)
+            loaded = time.perf_counter()
+            metrics.ALARM_DECODE.observe(loaded - start)
+            with tracing.span("audio.play", "alarm"):
+                play()
+            metrics.ALARM_PLAY.observe(time.perf_counter() - loaded)
+        except AudioError as e:
+            self.root.after(0, messagebox.showerror, "Error", f"Could not play the alarm: {e}")
+        self.raise_window()
+
+    def load_image(self, name):
+        if self.assets is not None and assets.variant(name, 1) in self.assets:
+            return self.assets.photo(name, self.root)
+        return tk.PhotoImage(file=resource_path(f"{name}.png"))
+
+    def bundled_alarm(self, alarm_file):
+        """ (pcm, rate, channels) if the bundle has ``alarm_file`` decoded for this backend. """
+        if self.assets is None or alarm_file != self.default_alarm_file:
+            return None
+        rate, channels = self.audio.pcm_format()
+        data = self.assets.pcm(assets.SOUND, rate, channels)
+        return None if data is None else (data, rate, channels)
+
+    def load_alarm(self, alarm_file):
+        """ Decode the alarm file or render the tone; returns what starts playback. """
+        if tones.is_tone(alarm_file):
+            rate, channels = self.audio.pcm_format()
+            data = tones.render(alarm_file, rate, channels)
+            return lambda: self.audio.play_pcm(data, rate, channels)
+        bundled = self.bundled_alarm(alarm_file)
+        if bundled is not None:
+            metrics.AUDIO_CACHE_HITS.inc()
+            return lambda: self.audio.play_pcm(*bundled)
+        key = self.alarm_key(alarm_file)
+        if key is None or key != self.loaded_alarm:
+            self.audio.load(alarm_file)
+            self.loaded_alarm = key
+            metrics.AUDIO_CACHE_MISSES.inc()
+        else:
+            # Decoded by preload_alarm and unchanged since.
+            metrics.AUDIO_CACHE_HITS.inc()
+        if self.loudness is not None:
+            self.audio.set_volume(self.loudness.gain(alarm_file))
+        return self.audio.play
+
+    def alarm_key(self, alarm_file):
+        """ What the backend's loaded sound must match to be reused; None if unknown. """
+        try:
+            st = os.stat(alarm_file)
+        except OSError:
+            return None
+        return os.path.abspath(alarm_file), st.st_mtime_ns, st.st_size
+
+    def preload_alarm(self, alarm_file):
+        try:
+            if tones.is_tone(alarm_file):
+                tones.render(alarm_file, *self.audio.pcm_format())
+            elif self.bundled_alarm(alarm_file) is None:
+                key = self.alarm_key(alarm_file)
+                if key is None or key != self.loaded_alarm:
+                    self.audio.preload(alarm_file)
+                    self.loaded_alarm = key
+                if self.loudness is not None:
+                    self.loudness.analyze(alarm_file)
+        except (AudioError, OSError):
+            # Reported when the alarm is due, where it matters.
+            pass
+
+    def build_plan(self, text=None):
+        if text is None:
+            text = self.plan_text.get().strip()
+        if text:
+            return compile_plan(text)
+        return simple_plan(self.study_minutes.get() * 60, self.break_minutes.get() * 60)
+
+    def phase_started(self, state):
+        # The state the worker got from the engine: stop_timer may already
+        # have cleared engine.state again.
+        phase, deadline = state
+        wall_deadline = time.time() + deadline - self.engine.clock()
+        if isinstance(self.group, GroupLeader):
+            self.group.announce(phase, wall_deadline)
+        self.bus.publish(events.PhaseStarted(phase, wall_deadline))
+
+    def break_deadline(self):
+        state = self.engine.state
+        if state is None or state[0] not in (BREAK, LONG_BREAK):
+            return None
+        return state[1]
+
+    def start_break_music(self, phase):
+        if self.playlist is not None and phase in (BREAK, LONG_BREAK):
+            self.playlist.start(self.break_deadline)
+
+    def stop_break_music(self):
+        # Right at the deadline, before the alarm starts.
+        if self.playlist is not None:
+            self.playlist.stop()
+
+    def run_timer(self, stop):
+        metrics.ACTIVE_TIMERS.inc()
+        try:
+            if isinstance(self.group, GroupFollower):
+                self._run_follower(stop)
+            else:
+                self._run_timer(stop)
+        finally:
+            metrics.ACTIVE_TIMERS.dec()
+
+    def run_finished(self, stop):
+        # Only if no newer run has started since.
+        if stop is self._stop:
+            self.stop_timer()
+
+    def _run_follower(self, stop):
+        # Phases come from the group leader; only the alarm is scheduled locally.
+        alarm_file = self.alarm_file.get()
+        self.preload_alarm(alarm_file)
+        group = self.group
+        seq = None
+        while not stop.is_set():
+            announcement = group.wait_announcement(seq, timeout=1)
+            if announcement is None:
+                continue
+            seq, phase, local_deadline = announcement
+            if phase is None:
+                self.engine.clear()
+                continue
+            remaining = local_deadline - time.time()
+            deadline = self.engine.set(phase, self.engine.clock() + remaining)
+            if remaining <= 0:
+                continue
+            self.bus.publish(events.PhaseStarted(phase, local_deadline))
+            self.start_break_music(phase)
+            with tracing.span(phase, "phase"):
+                reached = self.engine.wait_until(
+                    deadline, lambda: not stop.is_set() and group.seq == seq)
+            self.stop_break_music()
+            if reached:
+                self.bus.publish(events.PhaseEnded(phase))
+                self.play_alarm(alarm_file, phase)
+
+    def _run_timer(self, stop):
+        alarm_file = self.alarm_file.get()
 
-            for _ in range(break_seconds):
-                if not self.running:
+        # Phases follow the plan's timeline, so the alarm rings while the
+        # next phase is already counting down.
+        state = self.engine.start_plan(self.plan)
+        # Started after the plan so decoding and analysis eat into the first
+        # phase rather than delaying it.
+        self.preload_alarm(alarm_file)
+        while not stop.is_set() and state is not None:
+            phase = state[0]
+            self.phase_started(state)
+            self.start_break_music(phase)
+            with tracing.span(phase, "phase"):
+                if not self.engine.wait(lambda: not stop.is_set()):
                     return
-                time.sleep(1)
-            pygame.mixer.music.load(alarm_file)
-            pygame.mixer.music.play()
-
-            # Bring the window to the foreground and set focus on the mute button
-            self.root.deiconify()
-            self.root.lift()
-            self.root.focus_force()
-            self.root.wm_attributes("-topmost", 1)
-            self.stop_sound_button.focus()
+            self.stop_break_music()
+            self.bus.publish(events.PhaseEnded(phase))
+            self.play_alarm(alarm_file, phase)
+            if stop.is_set():
+                return
+            state = self.engine.advance()
+        stop.set()
+        self.post(self.run_finished, stop)
 
-            while pygame.mixer.music.get_busy() and self.running:
-                time.sleep(1)
+    def dump_trace(self, event=None):
+        if self.trace_path:
+            tracing.dump(self.trace_path)
 
     def on_closing(self):
         self.stop_timer()
+        self.monitor.dump()
+        self.dump_trace()
+        if self.group is not None:
+            self.group.close()
+        if self.recurring is not None:
+            self.recurring.stop()
+        if self.hooks is not None:
+            self.hooks.close()
+        self.prober.close()
+        self.closed = True
+        if self.audio is not None:
+            self.audio.close()
         self.root.destroy()
 
+def write_startup_report(app, path, imported):
+    """ Record when the window became visible and when the deferred startup
+    finished, then close; see bench/build_profiles.py.
+    """
+    app.root.wait_visibility(app.root)
+    window = time.time()
+
+    def finish():
+        report = {"launched": LAUNCHED, "imported": imported, "window": window, "ready": app.ready_at}
+        with open(path, "w") as f:
+            json.dump(report, f)
+        app.on_closing()
+    app.when_ready(finish)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Study/break timer")
+    parser.add_argument("--instrument", nargs="?", const="", metavar="PATH",
+                        help="measure Tk loop lag and callback times; report to PATH "
+                             "(rewritten periodically) or to stderr on exit")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="record a Chrome trace-event JSON file, written on exit "
+                             "or on Ctrl+Shift+T")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics on http://HOST:PORT/metrics")
+    parser.add_argument("--metrics-host", default="127.0.0.1", metavar="HOST",
+                        help="address to serve metrics on (default: %(default)s; "
+                             "0.0.0.0 lets a central Prometheus scrape this machine)")
+    parser.add_argument("--metrics-textfile", metavar="PATH",
+                        help="periodically write Prometheus metrics to PATH "
+                             "for the node exporter textfile collector")
+    parser.add_argument("--schedules", metavar="PATH",
+                        help='JSON list of recurring sessions, e.g. [{"cron": "0 9 * * mon-fri", '
+                             '"tz": "Europe/Berlin", "plan": "4 x (50 study, 10 break)"}]')
+    parser.add_argument("--calendar", action="append", metavar="ICS",
+                        help="schedule phases around busy events in this .ics file "
+                             "(may be given more than once)")
+    parser.add_argument("--audio", choices=sorted(BACKENDS), default="pygame",
+                        help="audio backend (default: pygame)")
+    parser.add_argument("--audio-process", action="store_true",
+                        help="play audio from a supervised child process")
+    parser.add_argument("--library", action="append", metavar="DIR",
+                        help="index the sounds in DIR for the library picker (may be given more than once)")
+    parser.add_argument("--break-playlist", metavar="PATH",
+                        help="play the music in this folder or .m3u playlist during breaks")
+    parser.add_argument("--no-normalize", dest="normalize", action="store_false",
+                        help="play alarm files at their own loudness")
+    parser.add_argument("--alarm-window", type=float, default=1.0, metavar="SECONDS",
+                        help="alarms firing within SECONDS of each other ring once (default 1)")
+    parser.add_argument("--hooks", metavar="PATH",
+                        help='JSON map of events (phase_start, phase_end, alarm_dismissed) '
+                             'to commands, e.g. {"phase_start": [["python", "mute_chat.py"]]}')
+    parser.add_argument("--startup-report", metavar="PATH",
+                        help="write startup timings as JSON to PATH once the window is visible, then exit")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--group-lead", nargs="?", const=DEFAULT_PORT, type=int, metavar="PORT",
+                       help=f"lead a LAN group session on UDP PORT (default {DEFAULT_PORT})")
+    group.add_argument("--group-follow", metavar="HOST[:PORT]",
+                       help="follow the phases of a group leader")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    # The audio player child is started with "spawn", which frozen builds must support.
+    multiprocessing.freeze_support()
+    imported = time.time()
+    args = parse_args()
+    if args.trace:
+        tracing.enable()
     root = tk.Tk()
-    app = StudyBreakTimer(root)
+    export_metrics = args.metrics_port is not None or args.metrics_textfile
+    monitor = UiMonitor(root, enabled=args.instrument is not None or bool(export_metrics),
+                        path=args.instrument or None, report=args.instrument is not None)
+    if export_metrics:
+        metrics.Histogram("tk_loop_lag_seconds", "Lateness of the Tk mainloop heartbeat.",
+                          source=lambda: monitor.histograms.get("tk_loop_lag"), scale=0.001)
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port, args.metrics_host)
+    if args.metrics_textfile:
+        metrics.start_textfile_writer(args.metrics_textfile)
+    group = None
+    if args.group_lead is not None:
+        group = GroupLeader(port=args.group_lead).start()
+    elif args.group_follow:
+        group = GroupFollower(parse_address(args.group_follow)).start()
+    rules = None
+    if args.schedules:
+        try:
+            rules = load_rules(args.schedules)
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("Error", f"Could not load schedules: {e}")
+    hooks = None
+    if args.hooks:
+        hooks = HookRunner()
+        try:
+            hooks.load(args.hooks)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not load hooks: {e}")
+    # Opened on a background thread once the window is up.
+    if args.audio_process:
+        audio_factory = lambda: ProcessBackend(args.audio)
+    else:
+        audio_factory = lambda: create_backend(args.audio)
+    app = StudyBreakTimer(root, monitor, trace_path=args.trace, group=group, rules=rules,
+                          calendars=args.calendar, hooks=hooks, audio_factory=audio_factory,
+                          loudness=LoudnessCache() if args.normalize else None,
+                          library_dirs=args.library, break_playlist=args.break_playlist,
+                          alarm_window=args.alarm_window)
+    monitor.start()
+    if args.startup_report:
+        root.after(0, write_startup_report, app, args.startup_report, imported)
     root.mainloop()
@@ -0,0 +1,245 @@
+""" Packed asset bundle: icons, their HiDPI variants and the decoded default sound.
+
+``assets.bin`` holds every asset in one file that is memory-mapped when
+the app starts, so loading the icons is one open and page-ins rather than
+a file per icon (each of which a onefile build first has to extract).
+Layout::
+
+    b"SBTA" version:u32 index_size:u32 index:JSON  blobs...
+
+The JSON index maps names to ``offset`` (from the first 16-byte boundary
+after the index; every blob is aligned) and ``size`` plus metadata, e.g. ``rate`` and ``channels`` for PCM. Build it
+with ``python assets.py``; the PNG scaling below is pure Python and the
+sound is decoded with ``decode.read_pcm``, so only that part needs NumPy
+and a decoder. Without a bundle the app loads the loose files as before.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+MAGIC = b"SBTA"
+VERSION = 1
+ALIGN = 16
+FILENAME = "assets.bin"
+ICONS = ("folder", "play", "stop", "mute")
+SCALES = (1, 2)
+SOUND = "default_sound"
+# The mixer format pygame opens by default; other formats fall back to the mp3.
+SOUND_FORMAT = (44100, 2)
+
+
+class AssetError(Exception):
+    pass
+
+
+class AssetBundle:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise AssetError(f"{path} is empty") from e
+        head = self._map[:12]
+        if len(head) < 12 or head[:4] != MAGIC:
+            raise AssetError(f"{path} is not an asset bundle")
+        version, size = struct.unpack("<II", head[4:])
+        if version != VERSION:
+            raise AssetError(f"{path} is version {version}, expected {VERSION}")
+        self.index = json.loads(self._map[12:12 + size])
+        self._base = _aligned(12 + size)
+        self._view = memoryview(self._map)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def data(self, name):
+        """ The asset's bytes as a zero-copy view into the mapped file. """
+        entry = self.index[name]
+        start = self._base + entry["offset"]
+        return self._view[start:start + entry["size"]]
+
+    def meta(self, name):
+        return self.index[name]
+
+    def photo(self, name, master, scale=None):
+        """ A PhotoImage of icon ``name`` at the variant closest to the display scale. """
+        import tkinter as tk
+        if scale is None:
+            scale = display_scale(master)
+        for candidate in sorted(SCALES, key=lambda s: abs(s - scale)):
+            key = variant(name, candidate)
+            if key in self.index:
+                return tk.PhotoImage(master=master, data=bytes(self.data(key)))
+        raise KeyError(name)
+
+    def pcm(self, name, rate, channels):
+        """ Decoded PCM for ``name`` if it is stored in this format, else None. """
+        if name not in self.index:
+            return None
+        entry = self.index[name]
+        if (entry.get("rate"), entry.get("channels")) != (rate, channels):
+            return None
+        return self.data(name)
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+
+
+def variant(name, scale):
+    return f"{name}.png" if scale == 1 else f"{name}@{scale}x.png"
+
+
+def display_scale(master):
+    # Tk reports 96 dpi at 100% scaling on every platform.
+    return master.winfo_fpixels("1i") / 96
+
+
+def open_bundle(path):
+    """ The bundle at ``path``, or None if there is none or it is unusable. """
+    try:
+        return AssetBundle(path)
+    except (OSError, AssetError, ValueError):
+        return None
+
+
+def _png_chunks(data):
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        raise AssetError("not a PNG file")
+    pos = 8
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        yield kind, data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def decode_png(data):
+    """ (width, height, rows of RGBA bytes) for 8-bit RGBA, non-interlaced PNGs. """
+    header = None
+    compressed = b""
+    for kind, body in _png_chunks(data):
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif kind == b"IDAT":
+            compressed += body
+    width, height, depth, color, _, _, interlace = header
+    if (depth, color, interlace) != (8, 6, 0):
+        raise AssetError("only 8-bit RGBA, non-interlaced PNGs can be scaled")
+    raw = zlib.decompress(compressed)
+    stride = width * 4
+    rows = []
+    previous = bytearray(stride)
+    for y in range(height):
+        start = y * (stride + 1)
+        kind = raw[start]
+        row = bytearray(raw[start + 1:start + 1 + stride])
+        for x in range(stride):
+            left = row[x - 4] if x >= 4 else 0
+            up = previous[x]
+            corner = previous[x - 4] if x >= 4 else 0
+            if kind == 1:
+                row[x] = (row[x] + left) & 0xFF
+            elif kind == 2:
+                row[x] = (row[x] + up) & 0xFF
+            elif kind == 3:
+                row[x] = (row[x] + (left + up) // 2) & 0xFF
+            elif kind == 4:
+                row[x] = (row[x] + _paeth(left, up, corner)) & 0xFF
+        rows.append(bytes(row))
+        previous = row
+    return width, height, rows
+
+
+def encode_png(width, height, rows):
+    def chunk(kind, body):
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+    raw = b"".join(b"\x00" + row for row in rows)
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 9))
+            + chunk(b"IEND", b""))
+
+
+def scale_png(data, factor):
+    """ Nearest-neighbour upscale, which keeps small pixel icons crisp. """
+    width, height, rows = decode_png(data)
+    scaled = []
+    for row in rows:
+        pixels = [row[i:i + 4] for i in range(0, len(row), 4)]
+        wide = b"".join(pixel * factor for pixel in pixels)
+        scaled += [wide] * factor
+    return encode_png(width * factor, height * factor, scaled)
+
+
+def build(root, out):
+    """ Pack the icons, their scaled variants and the decoded default sound. """
+    blobs = {}
+    for name in ICONS:
+        base = os.path.join(root, f"{name}.png")
+        with open(base, "rb") as f:
+            png = f.read()
+        for scale in SCALES:
+            # A hand-drawn name@2x.png wins over the generated one.
+            drawn = os.path.join(root, variant(name, scale))
+            if os.path.isfile(drawn):
+                with open(drawn, "rb") as f:
+                    blobs[variant(name, scale)] = (f.read(), {})
+            else:
+                blobs[variant(name, scale)] = (scale_png(png, scale) if scale > 1 else png, {})
+    warning = None
+    try:
+        from decode import read_pcm
+        rate, channels = SOUND_FORMAT
+        pcm = read_pcm(os.path.join(root, f"{SOUND}.mp3"), rate, channels)
+        blobs[SOUND] = (pcm, {"rate": rate, "channels": channels})
+    except Exception as e:
+        warning = f"default sound not pre-decoded: {e}"
+
+    index = {}
+    offset = 0
+    for name, (data, meta) in blobs.items():
+        index[name] = dict(meta, offset=offset, size=len(data))
+        offset = _aligned(offset + len(data))
+    text = json.dumps(index, sort_keys=True).encode()
+    base = _aligned(12 + len(text))
+    with open(out + ".tmp", "wb") as f:
+        f.write(MAGIC + struct.pack("<II", VERSION, len(text)) + text)
+        for name, (data, _) in blobs.items():
+            f.seek(base + index[name]["offset"])
+            f.write(data)
+    os.replace(out + ".tmp", out)
+    return warning
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the packed asset bundle.")
+    parser.add_argument("--root", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+    out = args.out or os.path.join(args.root, FILENAME)
+    warning = build(args.root, out)
+    if warning:
+        print(warning, file=sys.stderr)
+    bundle = AssetBundle(out)
+    print(f"{out}: {len(bundle.index)} assets, {os.path.getsize(out)} bytes")
+    bundle.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+""" Audio backends for alarm playback.
+
+Every backend loads a sound file (decoding it if needed), plays it, stops
+it and reports whether it is still playing, and can play raw 16-bit PCM.
+``pygame`` is the default. ``subprocess`` hands the work to a command-line
+player (paplay, aplay, mpg123, ffplay, afplay) so neither pygame nor SDL is
+imported. ``null`` plays nothing and is meant for tests and benchmarks.
+"""
+import collections
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from mixing import ChannelPool, PRIORITY_ALARM
+
+# Held while pygame's mixer is opened, here or by decode.py on a dummy driver.
+MIXER_LOCK = threading.Lock()
+
+
+class AudioError(Exception):
+    pass
+
+
+class AudioBackend:
+    name = None
+
+    def load(self, path):
+        raise NotImplementedError
+
+    def preload(self, path):
+        """ Get ``path`` ready ahead of the alarm; loading it is the default. """
+        self.load(path)
+
+    def play(self):
+        raise NotImplementedError
+
+    def play_pcm(self, data, rate, channels=1):
+        """ Play signed 16-bit little-endian interleaved samples. """
+        raise NotImplementedError
+
+    def queue_pcm(self, data, rate, channels=1):
+        """ Play PCM right after the queued or playing PCM, with no gap; now if none is. """
+        self.play_pcm(data, rate, channels)
+
+    def pcm_format(self):
+        """ (rate, channels) that ``play_pcm`` plays without conversion. """
+        return 44100, 1
+
+    def stop(self):
+        raise NotImplementedError
+
+    def busy(self):
+        raise NotImplementedError
+
+    def set_volume(self, volume):
+        pass
+
+    def close(self):
+        self.stop()
+
+
+class PygameBackend(AudioBackend):
+    """ Sounds are decoded into memory and played on pooled mixer channels.
+
+    ``pygame.mixer.music`` is a single global stream, so a second alarm would
+    cut off the first; pooled ``Channel`` objects let sounds overlap and
+    decide by priority which one gives way (see ``mixing.ChannelPool``).
+    """
+    name = "pygame"
+    CHANNELS = 8
+
+    def __init__(self):
+        # Imported here so the other backends never pay for pygame and SDL.
+        try:
+            import pygame
+        except ImportError as e:
+            raise AudioError("pygame is not installed") from e
+        self.pygame = pygame
+        try:
+            with MIXER_LOCK:
+                pygame.mixer.init()
+            pygame.mixer.set_num_channels(self.CHANNELS)
+            # Channel 0 is kept for queued PCM so one-off sounds never cut into it.
+            pygame.mixer.set_reserved(1)
+        except pygame.error as e:
+            # e.g. no audio device
+            raise AudioError(f"cannot open the mixer: {e}") from e
+        self.stream = pygame.mixer.Channel(0)
+        self.stream_sounds = collections.deque(maxlen=2)
+        self.pool = ChannelPool(pygame.mixer.Channel(i) for i in range(1, self.CHANNELS))
+        self.loaded = None
+        self.volume = 1.0
+
+    def load(self, path):
+        try:
+            self.loaded = self.pygame.mixer.Sound(path)
+        except self.pygame.error as e:
+            raise AudioError(str(e)) from e
+
+    def _play(self, sound, priority, volume=1.0):
+        channel = self.pool.acquire(priority)
+        if channel is None:
+            raise AudioError("every mixer channel is busy with a more important sound")
+        channel.set_volume(volume)
+        channel.play(sound)
+
+    def play(self, priority=PRIORITY_ALARM):
+        if self.loaded is None:
+            raise AudioError("no sound loaded")
+        self._play(self.loaded, priority, self.volume)
+
+    def play_pcm(self, data, rate, channels=1, priority=PRIORITY_ALARM):
+        frequency, _, mixer_channels = self.pygame.mixer.get_init()
+        if (frequency, mixer_channels) != (rate, channels):
+            raise AudioError(f"mixer runs at {frequency} Hz x {mixer_channels}, "
+                             f"buffer is {rate} Hz x {channels}")
+        self._play(self.pygame.mixer.Sound(buffer=data), priority)
+
+    def queue_pcm(self, data, rate, channels=1):
+        if (rate, channels) != self.pcm_format():
+            raise AudioError(f"mixer runs at {self.pcm_format()}, buffer is {(rate, channels)}")
+        sound = self.pygame.mixer.Sound(buffer=data)
+        # Channel.queue holds one sound; keep references to it and the current one.
+        self.stream_sounds.append(sound)
+        if self.stream.get_busy():
+            self.stream.queue(sound)
+        else:
+            self.stream.play(sound)
+
+    def pcm_format(self):
+        frequency, _, channels = self.pygame.mixer.get_init()
+        return frequency, channels
+
+    def stop(self):
+        self.pool.stop()
+        self.stream.stop()
+        self.stream_sounds.clear()
+
+    def busy(self):
+        return self.pool.busy() or self.stream.get_busy()
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def close(self):
+        self.stop()
+        self.pygame.mixer.quit()
+
+
+class SubprocessBackend(AudioBackend):
+    """ Plays through an external player process; stopping kills it. """
+    name = "subprocess"
+
+    WAV_PLAYERS = (["paplay"], ["aplay", "-q"], ["afplay"])
+    OTHER_PLAYERS = (["mpg123", "-q"], ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet"],
+                     ["afplay"])
+    PCM_PLAYERS = (
+        lambda rate, ch: ["paplay", "--raw", "--format=s16le", f"--rate={rate}", f"--channels={ch}"],
+        lambda rate, ch: ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-r", str(rate), "-c", str(ch)],
+    )
+
+    def __init__(self):
+        self.path = None
+        self.process = None
+        self.volume = 1.0
+        self._lock = threading.Lock()
+        # (process, queue, format) of the raw player fed by queue_pcm
+        self._stream = None
+
+    @classmethod
+    def available(cls):
+        return any(shutil.which(argv[0]) for argv in cls.WAV_PLAYERS + cls.OTHER_PLAYERS)
+
+    @staticmethod
+    def _find(candidates):
+        for argv in candidates:
+            if shutil.which(argv[0]):
+                return argv
+        return None
+
+    def load(self, path):
+        if not os.path.isfile(path):
+            raise AudioError(f"no such file: {path}")
+        self.path = path
+
+    def play(self):
+        wav = self.path.lower().endswith(".wav")
+        argv = self._find(self.WAV_PLAYERS if wav else self.OTHER_PLAYERS)
+        if argv is None:
+            raise AudioError("no command-line audio player found")
+        if argv[0] == "paplay":
+            # The only player here with a volume option; the others ignore set_volume.
+            argv = argv + [f"--volume={int(self.volume * 65536)}"]
+        self._spawn(argv + [self.path])
+
+    def _pcm_argv(self, rate, channels):
+        for make in self.PCM_PLAYERS:
+            argv = make(rate, channels)
+            if shutil.which(argv[0]):
+                return argv
+        raise AudioError("neither paplay nor aplay is available")
+
+    def play_pcm(self, data, rate, channels=1):
+        process = self._spawn(self._pcm_argv(rate, channels), stdin=subprocess.PIPE)
+        # Feed the pipe from a thread so a slow device never blocks the caller.
+        threading.Thread(target=self._feed, args=(process, data), daemon=True).start()
+
+    def queue_pcm(self, data, rate, channels=1):
+        # One raw player is fed buffer after buffer, so there is no gap between them.
+        with self._lock:
+            stream = self._stream
+            if stream is None or stream[0].poll() is not None or stream[2] != (rate, channels):
+                self._kill()
+                self.process = subprocess.Popen(self._pcm_argv(rate, channels), stdin=subprocess.PIPE,
+                                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                stream = self._stream = (self.process, queue.Queue(), (rate, channels))
+                threading.Thread(target=self._feed_queue, args=stream[:2], daemon=True).start()
+            stream[1].put(data)
+
+    @staticmethod
+    def _feed(process, data):
+        try:
+            process.stdin.write(data)
+            process.stdin.close()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _feed_queue(process, buffers):
+        while True:
+            data = buffers.get()
+            if data is None:
+                break
+            try:
+                process.stdin.write(data)
+                process.stdin.flush()
+            except (OSError, ValueError):
+                break
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+    def _spawn(self, argv, stdin=subprocess.DEVNULL):
+        with self._lock:
+            self._kill()
+            self.process = subprocess.Popen(argv, stdin=stdin, stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.DEVNULL)
+            return self.process
+
+    def _kill(self):
+        if self._stream is not None:
+            self._stream[1].put(None)
+            self._stream = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def stop(self):
+        with self._lock:
+            self._kill()
+
+    def busy(self):
+        process = self.process
+        return process is not None and process.poll() is None
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+
+class NullBackend(AudioBackend):
+    """ Plays nothing; a "sound" lasts ``duration`` seconds. Records every call. """
+    name = "null"
+
+    def __init__(self, duration=0.0, clock=time.monotonic):
+        self.duration = duration
+        self.clock = clock
+        self.path = None
+        self.until = 0.0
+        # Bounded so long soak runs do not grow memory.
+        self.calls = collections.deque(maxlen=1000)
+
+    def load(self, path):
+        self.calls.append(("load", path))
+        self.path = path
+
+    def play(self):
+        self.calls.append(("play", self.path))
+        self.until = self.clock() + self.duration
+
+    def play_pcm(self, data, rate, channels=1):
+        self.calls.append(("play_pcm", len(data)))
+        self.until = self.clock() + len(data) / (2 * channels * rate)
+
+    def queue_pcm(self, data, rate, channels=1):
+        self.calls.append(("queue_pcm", len(data)))
+        self.until = max(self.until, self.clock()) + len(data) / (2 * channels * rate)
+
+    def stop(self):
+        self.calls.append(("stop",))
+        self.until = 0.0
+
+    def busy(self):
+        return self.clock() < self.until
+
+
+BACKENDS = {"pygame": PygameBackend, "subprocess": SubprocessBackend, "null": NullBackend}
+
+
+def create_backend(name="pygame"):
+    try:
+        factory = BACKENDS[name]
+    except KeyError:
+        raise AudioError(f"unknown audio backend {name!r}") from None
+    if name == "subprocess" and not SubprocessBackend.available():
+        raise AudioError("no command-line audio player found" +
+                         (" (the subprocess backend needs Linux or macOS)" if sys.platform == "win32" else ""))
+    return factory()
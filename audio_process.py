@@ -0,0 +1,314 @@
+""" Audio playback in a child process, so SDL stalls never block the app.
+
+``ProcessBackend`` runs another backend in a spawned child and talks to it
+over a pipe. PCM buffers travel through shared memory rather than being
+pickled. The child reports command results and a "finished" event when
+playback ends. A watchdog pings it; if a command or ping goes unanswered
+for ``timeout`` seconds the stuck call raises AudioError and the watchdog
+thread kills the child and restarts it with the last loaded file. Loads
+decode the whole file, so they get ``LOAD_TIMEOUT`` instead and the
+watchdog holds its pings while one is in progress. No caller waits on
+another's request, and ``stop`` does not wait at all.
+"""
+import itertools
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+from audio import AudioBackend, AudioError, create_backend
+
+PING_INTERVAL = 1.0
+LOAD_TIMEOUT = 60.0
+
+
+def _player_main(conn, backend_name):
+    try:
+        backend = create_backend(backend_name)
+    except AudioError as e:
+        conn.send(("fatal", str(e)))
+        return
+    conn.send(("ready",))
+    playing = False
+    while True:
+        if conn.poll(0.1):
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            command, seq, args = message
+            if command == "quit":
+                break
+            result = None
+            try:
+                if command == "ping":
+                    pass
+                elif command == "format":
+                    result = backend.pcm_format()
+                elif command in ("load", "preload"):
+                    backend.load(*args)
+                elif command == "play":
+                    backend.play()
+                    playing = True
+                elif command in ("play_pcm", "queue_pcm"):
+                    name, size, rate, channels = args
+                    shm = shared_memory.SharedMemory(name=name)
+                    try:
+                        getattr(backend, command)(bytes(shm.buf[:size]), rate, channels)
+                    finally:
+                        shm.close()
+                    playing = True
+                elif command == "stop":
+                    backend.stop()
+                elif command == "volume":
+                    backend.set_volume(*args)
+                conn.send(("ok", seq, result))
+            except Exception as e:
+                conn.send(("error", seq, f"{type(e).__name__}: {e}"))
+        if playing and not backend.busy():
+            playing = False
+            conn.send(("finished",))
+    backend.close()
+
+
+class ProcessBackend(AudioBackend):
+    name = "process"
+
+    def __init__(self, backend_name="pygame", timeout=3.0):
+        self.backend_name = backend_name
+        self.timeout = timeout
+        self.restarts = 0
+        self._ctx = multiprocessing.get_context("spawn")
+        self._seq = itertools.count(1)
+        self._cond = threading.Condition()
+        # Only held to send, never while waiting for the child, so stop()
+        # and close() on the Tk thread never queue behind a stuck request.
+        self._lock = threading.Lock()
+        self._replies = {}
+        # Sequence numbers of loads the child is working on; pings would
+        # only queue behind them.
+        self._slow = set()
+        # Bumped by every restart, which fails the requests still waiting.
+        self._generation = 0
+        self._playing = False
+        self._loaded = None
+        self._shm = None
+        self._format = None
+        self._closed = False
+        self._broken = False
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self._conn, self._process = self._start_child()
+        threading.Thread(target=self._watchdog, name="audio-watchdog", daemon=True).start()
+
+    def _start_child(self):
+        parent, child = self._ctx.Pipe()
+        process = self._ctx.Process(target=_player_main, args=(child, self.backend_name),
+                                    name="audio-player", daemon=True)
+        process.start()
+        child.close()
+        # Spawning and importing the backend can take a while on first start.
+        if not parent.poll(max(self.timeout, 10.0)):
+            self._kill(parent, process)
+            raise AudioError("audio player did not start")
+        try:
+            reply = parent.recv()
+        except EOFError:
+            self._kill(parent, process)
+            raise AudioError("audio player exited during startup") from None
+        if reply[0] == "fatal":
+            self._kill(parent, process)
+            raise AudioError(reply[1])
+        threading.Thread(target=self._reader, args=(parent,), name="audio-reader",
+                         daemon=True).start()
+        return parent, process
+
+    def _reader(self, conn):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            with self._cond:
+                if message[0] == "finished":
+                    self._playing = False
+                elif message[0] in ("ok", "error") and message[1]:
+                    self._slow.discard(message[1])
+                    self._replies[message[1]] = message
+                self._cond.notify_all()
+
+    def _send(self, command, *args, slow=False):
+        """ Send a command; returns its sequence number, or None for a ping
+        that was skipped because a load is in progress. """
+        with self._lock:
+            if self._closed:
+                raise AudioError("audio player is closed")
+            if self._conn is None:
+                raise AudioError("audio player is restarting")
+            if command == "ping" and self._slow:
+                return None
+            seq = next(self._seq)
+            if slow:
+                self._slow.add(seq)
+            try:
+                self._conn.send((command, seq, args))
+            except (OSError, ValueError):
+                self._slow.discard(seq)
+                self._fail()
+                raise AudioError("audio player connection lost") from None
+        return seq
+
+    def _request(self, command, *args, timeout=None):
+        with self._cond:
+            generation = self._generation
+        seq = self._send(command, *args, slow=timeout is not None)
+        if seq is None:
+            return None
+        with self._cond:
+            answered = self._cond.wait_for(
+                lambda: seq in self._replies or self._generation != generation,
+                timeout or self.timeout)
+            reply = self._replies.pop(seq, None)
+            self._slow.discard(seq)
+        if reply is None:
+            if answered:
+                raise AudioError(f"audio player restarted before answering {command!r}")
+            self._fail()
+            raise AudioError(f"audio player did not answer {command!r}; restarting it")
+        if reply[0] == "error":
+            raise AudioError(reply[2])
+        return reply[2]
+
+    def _fail(self):
+        # The watchdog restarts the child; callers only report the failure.
+        self._broken = True
+        self._wake.set()
+
+    def _restart(self):
+        with self._lock:
+            conn, process, self._conn = self._conn, self._process, None
+        self.restarts += 1
+        self._kill(conn, process)
+        with self._cond:
+            self._replies.clear()
+            self._slow.clear()
+            self._playing = False
+            self._generation += 1
+            self._cond.notify_all()
+        conn, process = self._start_child()
+        with self._lock:
+            if self._closed:
+                self._kill(conn, process)
+                return
+            self._conn, self._process = conn, process
+            self._broken = False
+            if self._loaded is not None:
+                # Nobody waits for this reply, but pings still hold off until it comes.
+                seq = next(self._seq)
+                self._slow.add(seq)
+                conn.send(("load", seq, (self._loaded,)))
+
+    def _kill(self, conn, process):
+        if process is not None and process.is_alive():
+            process.kill()
+            process.join(1.0)
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _watchdog(self):
+        while not self._stopped.is_set():
+            self._wake.wait(PING_INTERVAL)
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                if self._broken:
+                    self._restart()
+                else:
+                    self._request("ping")
+            except AudioError:
+                # A failed ping marks the child broken; a failed restart is retried.
+                pass
+
+    def load(self, path):
+        self._request("load", path, timeout=max(self.timeout, LOAD_TIMEOUT))
+        self._loaded = path
+
+    def preload(self, path):
+        self._request("preload", path, timeout=max(self.timeout, LOAD_TIMEOUT))
+        self._loaded = path
+
+    def play(self):
+        with self._cond:
+            self._playing = True
+        self._request("play")
+
+    def play_pcm(self, data, rate, channels=1):
+        shm = self._shm
+        if shm is None or shm.size < len(data):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            shm = self._shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        shm.buf[:len(data)] = data
+        with self._cond:
+            self._playing = True
+        self._request("play_pcm", shm.name, len(data), rate, channels)
+
+    def queue_pcm(self, data, rate, channels=1):
+        # Queued buffers come from the playlist thread while play_pcm may be
+        # filling the shared block, so each gets a block of its own, freed
+        # once the child has copied it.
+        shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        try:
+            shm.buf[:len(data)] = data
+            with self._cond:
+                self._playing = True
+            self._request("queue_pcm", shm.name, len(data), rate, channels)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def pcm_format(self):
+        if self._format is None:
+            self._format = tuple(self._request("format"))
+        return self._format
+
+    def stop(self):
+        with self._cond:
+            self._playing = False
+        # Not waiting for the reply: a stuck child is killed by the watchdog,
+        # which silences it just as well.
+        try:
+            self._send("stop")
+        except AudioError:
+            pass
+
+    def busy(self):
+        return self._playing
+
+    def set_volume(self, volume):
+        self._request("volume", volume)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            conn, process = self._conn, self._process
+        self._stopped.set()
+        self._wake.set()
+        if conn is not None:
+            try:
+                conn.send(("quit", 0, ()))
+            except (OSError, ValueError):
+                pass
+        if process is not None:
+            process.join(2.0)
+        self._kill(conn, process)
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
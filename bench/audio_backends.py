@@ -0,0 +1,72 @@
+""" Compare audio backends: startup time, RSS and alarm latency.
+
+Each backend is measured in a fresh interpreter so imports and RSS are not
+shared between runs.
+
+    python bench/audio_backends.py [--sound default_sound.mp3] [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+import metrics
+base_rss = metrics.rss_bytes()
+t1 = time.perf_counter()
+import audio
+backend = audio.create_backend({name!r})
+t2 = time.perf_counter()
+backend.load({sound!r})
+t3 = time.perf_counter()
+backend.play()
+t4 = time.perf_counter()
+rss = metrics.rss_bytes()
+backend.close()
+print(json.dumps({{"startup": t2 - t1, "load": t3 - t2, "play": t4 - t3,
+                   "rss": rss, "rss_delta": rss - base_rss}}))
+"""
+
+
+def measure(name, sound):
+    code = CHILD.format(root=ROOT, name=name, sound=sound)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode:
+        lines = result.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sound", default=os.path.join(ROOT, "default_sound.mp3"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", default=["null", "subprocess", "pygame"])
+    args = parser.parse_args(argv)
+
+    print(f"{'backend':<12} {'startup ms':>11} {'load ms':>9} {'play ms':>9} "
+          f"{'RSS MiB':>9} {'+RSS MiB':>9}")
+    for name in args.backends:
+        runs = [measure(name, args.sound) for _ in range(args.runs)]
+        errors = [r["error"] for r in runs if "error" in r]
+        if errors:
+            print(f"{name:<12} unavailable: {errors[0]}")
+            continue
+
+        def median(key):
+            return statistics.median(r[key] for r in runs)
+
+        print(f"{name:<12} {median('startup') * 1000:>11.2f} {median('load') * 1000:>9.2f} "
+              f"{median('play') * 1000:>9.2f} {median('rss') / 2**20:>9.1f} "
+              f"{median('rss_delta') / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
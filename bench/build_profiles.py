@@ -0,0 +1,125 @@
+""" Build every PyInstaller profile and compare size and startup time.
+
+Each profile is built into its own dist/work directories under --out, then
+launched --runs times with --startup-report. The app reports when Python
+started running app.py, when the window became visible and when its
+deferred startup (audio backend, icons, saved settings) finished, so the
+table shows:
+
+    size       the executable, or the whole folder for onedir builds
+               (the "source" profile runs app.py with this interpreter)
+    extract    spawn until app.py runs (bootloader, onefile extraction)
+    to window  spawn until the window is visible (cold start)
+    to ready   spawn until every control is enabled
+
+    python bench/build_profiles.py [--runs 5] [--profiles default slim slim-onedir]
+    python bench/build_profiles.py --skip-build   # re-time existing builds
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    # Not a build: the app run by this interpreter, for comparison.
+    "source": (None, {}),
+    "default": ("StudyBreakTimer.spec", {}),
+    "slim": ("StudyBreakTimer-slim.spec", {}),
+    "slim-upx": ("StudyBreakTimer-slim.spec", {"STUDYTIMER_UPX": "1"}),
+    "slim-onedir": ("StudyBreakTimer-slim.spec", {"STUDYTIMER_ONEDIR": "1"}),
+}
+EXE_NAME = "StudyBreakTimer" + (".exe" if sys.platform == "win32" else "")
+
+
+def build(name, out):
+    spec, env = PROFILES[name]
+    if spec is None:
+        return
+    # Fixed hash seed and timestamps so repeated builds come out the same.
+    env = dict(os.environ, PYTHONHASHSEED="0", SOURCE_DATE_EPOCH="1700000000", **env)
+    subprocess.run([sys.executable, "-m", "PyInstaller", "--noconfirm", "--clean",
+                    "--distpath", os.path.join(out, name, "dist"),
+                    "--workpath", os.path.join(out, name, "work"),
+                    os.path.join(ROOT, spec)],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+
+
+def command(name, out):
+    """ The command that starts ``name``, or None if it has not been built. """
+    if PROFILES[name][0] is None:
+        return [sys.executable, os.path.join(ROOT, "app.py")]
+    dist = os.path.join(out, name, "dist")
+    for exe in (os.path.join(dist, "StudyBreakTimer", EXE_NAME), os.path.join(dist, EXE_NAME)):
+        if os.path.isfile(exe):
+            return [exe]
+    return None
+
+
+def size_of(argv):
+    if len(argv) > 1:
+        return None
+    folder = os.path.dirname(argv[0])
+    if os.path.basename(folder) != "StudyBreakTimer":
+        return os.path.getsize(argv[0])
+    return sum(os.path.getsize(os.path.join(dirpath, f))
+               for dirpath, _, files in os.walk(folder) for f in files)
+
+
+def launch(argv, timeout):
+    fd, report = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        spawned = time.time()
+        subprocess.run(argv + ["--startup-report", report], timeout=timeout, check=True)
+        with open(report) as f:
+            data = json.load(f)
+    finally:
+        os.unlink(report)
+    return data["launched"] - spawned, data["window"] - spawned, data["ready"] - spawned
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=list(PROFILES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", default=os.path.join(tempfile.gettempdir(), "studytimer-profiles"))
+    parser.add_argument("--skip-build", action="store_true")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    print(f"{'profile':<12} {'size MiB':>9} {'extract ms':>11} {'to window ms':>13} {'to ready ms':>12}")
+    for name in args.profiles:
+        if not args.skip_build:
+            try:
+                build(name, args.out)
+            except subprocess.CalledProcessError as e:
+                lines = e.stderr.decode(errors="replace").strip().splitlines()
+                print(f"{name:<12} build failed: {lines[-1] if lines else e}")
+                continue
+        argv = command(name, args.out)
+        if argv is None:
+            print(f"{name:<12} not built")
+            continue
+        try:
+            # The first launch also warms the OS file cache; it is not counted.
+            launch(argv, args.timeout)
+            runs = [launch(argv, args.timeout) for _ in range(args.runs)]
+        except (OSError, subprocess.SubprocessError, ValueError, KeyError) as e:
+            print(f"{name:<12} launch failed: {e}")
+            continue
+        extract = statistics.median(r[0] for r in runs) * 1000
+        window = statistics.median(r[1] for r in runs) * 1000
+        ready = statistics.median(r[2] for r in runs) * 1000
+        size = size_of(argv)
+        size = f"{size / 2**20:>9.1f}" if size is not None else f"{'-':>9}"
+        print(f"{name:<12} {size} {extract:>11.0f} {window:>13.0f} {ready:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
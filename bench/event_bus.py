@@ -0,0 +1,45 @@
+""" Microbenchmark of EventBus.publish per-event cost.
+
+    python bench/event_bus.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events import EventBus, PhaseStarted  # noqa: E402
+
+
+def per_call_ns(stmt, number):
+    best = min(timeit.repeat(stmt, number=number, repeat=5))
+    return best / number * 1e9
+
+
+def main():
+    number = 200000
+    event = PhaseStarted("study", 0.0)
+
+    bus = EventBus()
+    print(f"{'subscribers':>12} {'publish ns':>12} {'ns/handler':>12}")
+    ns = per_call_ns(lambda: bus.publish(event), number)
+    print(f"{0:>12} {ns:>12.1f} {'-':>12}")
+    guarded = per_call_ns(lambda: bus.wants(PhaseStarted) and bus.publish(PhaseStarted("study", 0.0)),
+                          number)
+    print(f"{'0 (guarded)':>12} {guarded:>12.1f} {'-':>12}")
+
+    for count in (1, 10, 100):
+        bus = EventBus()
+        for _ in range(count):
+            bus.subscribe(PhaseStarted, lambda e: None)
+        ns = per_call_ns(lambda: bus.publish(event), max(1000, number // count))
+        print(f"{count:>12} {ns:>12.1f} {ns / count:>12.1f}")
+
+    bus = EventBus()
+    bus.subscribe(PhaseStarted, lambda e: None, queued=True)
+    ns = per_call_ns(lambda: bus.publish(event), number // 10)
+    print(f"{'1 (queued)':>12} {ns:>12.1f} {'-':>12}")
+
+
+if __name__ == "__main__":
+    main()
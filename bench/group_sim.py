@@ -0,0 +1,93 @@
+""" Loopback simulation of a group session with many skewed followers.
+
+Runs one GroupLeader and N GroupFollowers in this process. Each follower
+sees a wall clock shifted by a random skew; after a few phase
+announcements we compare every follower's local deadline, mapped back to
+true time, with the leader's deadline.
+
+    python bench/group_sim.py --followers 200 --phases 3
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from group import GroupLeader, GroupFollower  # noqa: E402
+
+
+def skewed_clock(skew):
+    return lambda: time.time() + skew
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--followers", type=int, default=200)
+    parser.add_argument("--phases", type=int, default=3)
+    parser.add_argument("--phase-seconds", type=float, default=1.0)
+    parser.add_argument("--max-skew", type=float, default=30.0,
+                        help="followers' clocks are off by up to this many seconds")
+    parser.add_argument("--tolerance-ms", type=float, default=50.0)
+    args = parser.parse_args(argv)
+
+    leader = GroupLeader("127.0.0.1", 0).start()
+    followers = []
+    for _ in range(args.followers):
+        skew = random.uniform(-args.max_skew, args.max_skew)
+        followers.append((skew, GroupFollower(leader.address, clock=skewed_clock(skew)).start()))
+    # Let the initial sync burst finish.
+    time.sleep(1.5)
+
+    errors = []
+    lock = threading.Lock()
+
+    def follow(skew, follower, done):
+        seq = None
+        while len(done) < args.phases:
+            announcement = follower.wait_announcement(seq, timeout=5)
+            if announcement is None:
+                return
+            seq, phase, local_deadline = announcement
+            if phase is None:
+                continue
+            with lock:
+                done.append(local_deadline - skew)
+
+    results = [[] for _ in followers]
+    threads = [threading.Thread(target=follow, args=(skew, follower, results[i]), daemon=True)
+               for i, (skew, follower) in enumerate(followers)]
+    for thread in threads:
+        thread.start()
+    deadlines = []
+    for n in range(args.phases):
+        deadline = time.time() + args.phase_seconds
+        deadlines.append(deadline)
+        leader.announce("study" if n % 2 == 0 else "break", deadline)
+        time.sleep(args.phase_seconds)
+    for thread in threads:
+        thread.join(5)
+    leader.stop()
+
+    for result in results:
+        for true_deadline, follower_deadline in zip(deadlines, result):
+            errors.append(abs(follower_deadline - true_deadline) * 1000)
+    missing = args.followers * args.phases - len(errors)
+    errors.sort()
+    for _, follower in followers:
+        follower.close()
+    leader.close()
+
+    print(f"followers={args.followers} announcements={len(errors)} missing={missing}")
+    if errors:
+        print(f"deadline error ms: p50={errors[len(errors) // 2]:.3f} "
+              f"p99={errors[int(len(errors) * 0.99)]:.3f} max={errors[-1]:.3f}")
+    ok = not missing and errors and errors[-1] <= args.tolerance_ms
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
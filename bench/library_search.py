@@ -0,0 +1,53 @@
+""" Latency of as-you-type sound library search over a synthetic index.
+
+    python bench/library_search.py [--files 10000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library import Library  # noqa: E402
+
+WORDS = ("bell", "chime", "alarm", "soft", "gong", "rain", "birds", "piano", "wake", "ding",
+         "digital", "retro", "ocean", "forest", "synth", "marimba", "harp", "clock", "buzz", "tone")
+
+
+def fake_index(count, rng):
+    index = {}
+    for i in range(count):
+        name = "_".join(rng.sample(WORDS, rng.randint(1, 3))) + f"_{i:05d}" + rng.choice((".mp3", ".wav"))
+        index[f"/sounds/{rng.choice(WORDS)}/{name}"] = {"duration": rng.uniform(1, 30)}
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    library = Library(fake_index(args.files, rng))
+    print(f"built index of {len(library)} files in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # Every prefix of each query, as if typed one key at a time.
+    queries = ["chime", "soft_bell", "mrmba", "frst", "zzzz", "0042", "ocean_rain"]
+    print(f"{'query':<12} {'results':>8} {'median ms':>10} {'max ms':>8}")
+    for query in queries:
+        times = []
+        for n in range(1, len(query) + 1):
+            for _ in range(5):
+                start = time.perf_counter()
+                results = library.search(query[:n])
+                times.append((time.perf_counter() - start) * 1000)
+        print(f"{query:<12} {len(results):>8} {statistics.median(times):>10.2f} {max(times):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+""" Load generator for server.py: measures phase-transition fan-out latency.
+
+Opens many concurrent client connections on loopback, starts short
+sessions and records, for every transition received, how long after the
+phase's scheduled start it arrived.
+
+    python bench/loadgen.py --clients 10000 --period 2 --duration 20
+    python bench/loadgen.py --clients 10000 --shared   # all clients on one session
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def raise_fd_limit():
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def open_connection(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def client(args, index, connect_slots, ready, go, latencies):
+    session = "shared" if args.shared else f"s{index}"
+    async with connect_slots:
+        reader, writer = await open_connection(args)
+    ready.append(index)
+    await go.wait()
+    if not args.shared or index == 0:
+        writer.write(json.dumps({"op": "start", "session": session,
+                                 "study": args.period, "break": args.period}).encode() + b"\n")
+    if args.shared and index:
+        # Let the owner create the session before subscribing.
+        await asyncio.sleep(0.5)
+    writer.write(json.dumps({"op": "subscribe", "session": session}).encode() + b"\n")
+    first = True
+    end = time.time() + args.duration
+    try:
+        while time.time() < end:
+            try:
+                line = await asyncio.wait_for(reader.readline(), end - time.time())
+            except asyncio.TimeoutError:
+                break
+            if not line:
+                break
+            now = time.time()
+            message = json.loads(line)
+            if message.get("event") != "phase":
+                continue
+            # The subscribe reply reports the current phase rather than a transition.
+            if first:
+                first = False
+                continue
+            latencies.append(now - message["started"])
+    finally:
+        writer.close()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(args):
+    raise_fd_limit()
+    connect_slots = asyncio.Semaphore(args.connect_concurrency)
+    ready, latencies = [], []
+    go = asyncio.Event()
+    tasks = [asyncio.create_task(client(args, i, connect_slots, ready, go, latencies))
+             for i in range(args.clients)]
+    while len(ready) < args.clients:
+        failed = [t for t in tasks if t.done() and t.exception()]
+        if failed:
+            raise failed[0].exception()
+        await asyncio.sleep(0.1)
+    print(f"{len(ready)} clients connected")
+    go.set()
+    await asyncio.gather(*tasks)
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    print(f"transitions received: {len(ms)}")
+    if ms:
+        print(f"fan-out latency ms: p50={percentile(ms, 0.5):.2f} p90={percentile(ms, 0.9):.2f} "
+              f"p99={percentile(ms, 0.99):.2f} max={ms[-1]:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--shared", action="store_true",
+                        help="subscribe every client to one session instead of one each")
+    parser.add_argument("--period", type=float, default=2.0,
+                        help="study and break length in seconds")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--connect-concurrency", type=int, default=256)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH")
+    parser.add_argument("--no-spawn", action="store_true",
+                        help="use an already running server instead of starting one")
+    args = parser.parse_args(argv)
+
+    server = None
+    if not args.no_spawn:
+        command = [sys.executable, os.path.join(ROOT, "server.py"), "--host", args.host,
+                   "--port", str(args.port)]
+        if args.unix:
+            command += ["--unix", args.unix]
+        server = subprocess.Popen(command)
+        time.sleep(1.0)
+    try:
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
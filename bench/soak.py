@@ -0,0 +1,242 @@
+""" Soak test: months of simulated sessions, failing if resources grow.
+
+Runs the real StudyBreakTimer on a virtual clock, so every phase ends as
+soon as the worker thread gets to wait for it. Each cycle starts a
+session, waits for the alarm, stops the sound and stops the timer; every
+--restart-every cycles the timer is stopped mid-phase and started again
+straight away, the case that used to let the previous worker carry on.
+
+Every --check-every cycles the harness records live threads, RSS, open
+file descriptors, Tk widgets and pending ``after`` callbacks, and checks
+that the mixer is idle and that at most one timer thread is alive. The
+run fails (exit status 1) if any count is above its level after the
+warm-up, or RSS grew by more than --rss-slack MiB.
+
+    python bench/soak.py [--days 90] [--audio null]
+"""
+import argparse
+import gc
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tkinter as tk  # noqa: E402
+
+import events  # noqa: E402
+from app import StudyBreakTimer  # noqa: E402
+from audio import NullBackend, create_backend  # noqa: E402
+
+
+class VirtualClock:
+    """ A monotonic clock that sleeping advances instead of waiting on. """
+
+    def __init__(self):
+        self.now = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.now += max(0.0, seconds)
+        # Let the Tk thread run, as a real sleep would.
+        time.sleep(0)
+
+
+def write_tone(path, seconds=0.5, rate=22050):
+    """ A short 880 Hz beep: a readable, non-silent alarm file. """
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        sample = int(12000 * math.sin(2 * math.pi * 880 * i / rate))
+        frames += sample.to_bytes(2, "little", signed=True)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(bytes(frames))
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def open_fds():
+    for path in ("/proc/self/fd", "/dev/fd"):
+        if os.path.isdir(path):
+            return len(os.listdir(path))
+    return None
+
+
+def count_widgets(widget):
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+
+def timer_threads():
+    return sum(1 for t in threading.enumerate() if t.name == "timer")
+
+
+class Soak:
+    def __init__(self, root, app, clock, args):
+        self.root = root
+        self.app = app
+        self.clock = clock
+        self.args = args
+        self.cycles = 0
+        self.alarms = 0
+        self.samples = []
+        self.failures = []
+        self.random = random.Random(args.seed)
+        app.bus.subscribe(events.AlarmStarted, self.alarm_started)
+
+    def alarm_started(self, event):
+        self.alarms += 1
+
+    def sample(self):
+        gc.collect()
+        return {
+            "cycle": self.cycles,
+            "days": self.clock() / 86400,
+            "threads": threading.active_count(),
+            "timers": timer_threads(),
+            "rss": rss_bytes(),
+            "fds": open_fds(),
+            "widgets": count_widgets(self.root),
+            "afters": len(self.root.tk.splitlist(self.root.tk.call("after", "info"))),
+        }
+
+    def check(self):
+        sample = self.sample()
+        self.samples.append(sample)
+        if sample["timers"] > 1:
+            self.failures.append(f"cycle {self.cycles}: {sample['timers']} timer threads alive")
+        if self.app.audio.busy():
+            self.failures.append(f"cycle {self.cycles}: the mixer is still playing after stop_sound")
+        print(f"{sample['days']:>7.1f} {sample['cycle']:>7} {sample['threads']:>8} "
+              f"{(sample['rss'] or 0) / 2**20:>8.1f} {sample['fds'] or '-':>5} "
+              f"{sample['widgets']:>8} {sample['afters']:>7}", flush=True)
+
+    def run(self):
+        print(f"{'days':>7} {'cycles':>7} {'threads':>8} {'RSS MiB':>8} {'fds':>5} {'widgets':>8} {'afters':>7}")
+        self.root.after(0, self.step)
+
+    def wait(self, condition, then, what, timeout=10.0):
+        """ Poll ``condition`` from the Tk loop, then call ``then``. """
+        deadline = time.monotonic() + timeout
+
+        def poll():
+            if condition():
+                then()
+            elif time.monotonic() > deadline:
+                self.failures.append(f"cycle {self.cycles}: timed out waiting for {what}")
+                self.report()
+            else:
+                self.root.after(1, poll)
+        poll()
+
+    def idle(self, then):
+        # Stopped workers exit within a moment; one that lingers was revived.
+        self.wait(lambda: timer_threads() == 0, then, "the stopped timer thread to exit")
+
+    def step(self):
+        if self.clock() >= self.args.days * 86400 or len(self.failures) > 20:
+            self.idle(self.report)
+            return
+        self.cycles += 1
+        if self.cycles % self.args.check_every == 0:
+            self.idle(self.checked)
+        else:
+            self.start()
+
+    def checked(self):
+        self.check()
+        self.start()
+
+    def start(self):
+        alarms = self.alarms
+        self.app.start_timer()
+        if self.cycles % self.args.restart_every == 0:
+            # Stop mid-phase and start again at once: the old worker must not resume.
+            self.app.stop_timer()
+            self.app.start_timer()
+        self.wait(lambda: self.alarms > alarms, self.end_cycle, "the alarm")
+
+    def end_cycle(self):
+        self.app.stop_sound()
+        self.app.stop_timer()
+        # Let the stopped worker notice before the next start, most of the time.
+        delay = 0 if self.random.random() < 0.5 else 2
+        self.root.after(delay, self.step)
+
+    def report(self):
+        self.check()
+        baseline = self.samples[min(len(self.samples) - 1, self.args.warmup)]
+        final = self.samples[-1]
+        for key in ("threads", "fds", "widgets", "afters"):
+            if final[key] is not None and final[key] > baseline[key]:
+                self.failures.append(f"{key} grew from {baseline[key]} to {final[key]}")
+        if baseline["rss"] is not None and final["rss"] - baseline["rss"] > self.args.rss_slack * 2**20:
+            self.failures.append(f"RSS grew by {(final['rss'] - baseline['rss']) / 2**20:.1f} MiB")
+        print(f"{self.cycles} cycles, {self.alarms} alarms, {self.clock() / 86400:.1f} simulated days")
+        for failure in self.failures:
+            print("FAIL:", failure)
+        self.app.on_closing()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=float, default=90.0, help="simulated days to run for")
+    parser.add_argument("--audio", choices=("null", "pygame", "subprocess"), default="null")
+    parser.add_argument("--check-every", type=int, default=200, metavar="CYCLES")
+    parser.add_argument("--restart-every", type=int, default=7, metavar="CYCLES")
+    parser.add_argument("--warmup", type=int, default=2, metavar="CHECKS",
+                        help="checks to skip before taking the baseline")
+    parser.add_argument("--rss-slack", type=float, default=8.0, metavar="MIB")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    clock = VirtualClock()
+    audio = NullBackend(duration=5.0, clock=clock) if args.audio == "null" else create_backend(args.audio)
+    alarm = os.path.join(tempfile.mkdtemp(prefix="studytimer-soak-"), "alarm.wav")
+    write_tone(alarm)
+    root = tk.Tk()
+    root.withdraw()
+    app = StudyBreakTimer(root, audio=audio, clock=clock, sleep=clock.sleep)
+    app.alarm_file.set(alarm)
+    # The timer raises the window at every alarm; keep it out of the way.
+    app.raise_window = lambda: None
+    soak = Soak(root, app, clock, args)
+
+    def probed():
+        # An alarm that failed its probe would stop every start at a dialog.
+        if not app.probe_result.ok:
+            print(f"cannot soak with {alarm}: {app.probe_result.error}")
+            soak.failures.append("alarm file failed its probe")
+            app.on_closing()
+        else:
+            soak.run()
+    app.when_ready(lambda: soak.wait(lambda: app.probe_result is not None, probed, "the alarm probe"))
+    root.mainloop()
+    os.unlink(alarm)
+    os.rmdir(os.path.dirname(alarm))
+    sys.exit(1 if soak.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
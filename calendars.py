@@ -0,0 +1,319 @@
+""" Busy periods from .ics calendar files.
+
+Files are streamed line by line, so calendars with thousands of events are
+never held in memory as text. Busy intervals from all files go into a
+static interval tree answering overlap queries in O(log n + k). Each file's
+parsed intervals are cached with its mtime and size; ``CalendarSet.refresh``
+re-parses only files that changed and rebuilds the tree only if one did.
+
+Recurring events (RRULE with FREQ=DAILY or WEEKLY, INTERVAL, COUNT, UNTIL,
+BYDAY and EXDATE) are expanded over a window around the present. An event
+with a value that cannot be parsed is skipped on its own; the rest of the
+file still counts. TZID times are read as local time when Python has no
+timezone database (Windows without the tzdata package); ``CalendarSet``
+lists the zones this happened to so the app can say so.
+"""
+import datetime
+import os
+import time
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+HORIZON_DAYS = 30
+REFRESH_INTERVAL = 60.0
+_WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+# What a malformed value raises on its way through the parsers below.
+_BAD_VALUE = (ValueError, KeyError, IndexError, OverflowError)
+
+
+class IntervalTree:
+    """ Static interval tree over half-open ``(start, end)`` intervals.
+
+    Intervals are sorted by start and laid out as an implicit balanced BST
+    (the middle element of every slice is its root); each node stores the
+    largest end in its subtree so whole subtrees can be skipped.
+    """
+
+    def __init__(self, intervals):
+        self.intervals = sorted((start, end) for start, end in intervals if end > start)
+        self.max_end = [0.0] * len(self.intervals)
+        self._build(0, len(self.intervals))
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        end = max(self.intervals[mid][1], self._build(lo, mid), self._build(mid + 1, hi))
+        self.max_end[mid] = end
+        return end
+
+    def overlaps(self, start, end):
+        """ All intervals overlapping ``[start, end)``, ordered by start. """
+        found = []
+        self._collect(0, len(self.intervals), start, end, found)
+        return found
+
+    def _collect(self, lo, hi, start, end, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self.max_end[mid] <= start:
+            return
+        self._collect(lo, mid, start, end, found)
+        interval = self.intervals[mid]
+        if interval[0] >= end:
+            return
+        if interval[1] > start:
+            found.append(interval)
+        self._collect(mid + 1, hi, start, end, found)
+
+    def first_overlap(self, start, end):
+        """ The earliest-starting interval overlapping ``[start, end)``, or None. """
+        return self._first(0, len(self.intervals), start, end)
+
+    def _first(self, lo, hi, start, end):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        if self.max_end[mid] <= start:
+            return None
+        left = self._first(lo, mid, start, end)
+        if left is not None:
+            return left
+        interval = self.intervals[mid]
+        if interval[0] >= end:
+            return None
+        if interval[1] > start:
+            return interval
+        return self._first(mid + 1, hi, start, end)
+
+
+def _unfolded_lines(f):
+    current = None
+    for raw in f:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t"):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _split(line):
+    """ ``NAME;PARAM=X:VALUE`` -> (name, params, value). """
+    head, _, value = line.partition(":")
+    name, *params = head.split(";")
+    return name.upper(), dict(p.split("=", 1) for p in params if "=" in p), value
+
+
+def tz_database_missing():
+    """ True if zoneinfo has no data at all, as on Windows without tzdata. """
+    if ZoneInfo is None:
+        return True
+    try:
+        ZoneInfo("UTC")
+    except ZoneInfoNotFoundError:
+        return True
+    return False
+
+
+def _timestamp(value, params, unresolved=None):
+    value = value.strip()
+    if len(value) == 8:
+        # All-day values are dates in local time.
+        day = datetime.datetime.strptime(value, "%Y%m%d")
+        return day.timestamp(), True
+    if value.endswith("Z"):
+        moment = datetime.datetime.strptime(value, "%Y%m%dT%H%M%SZ")
+        return moment.replace(tzinfo=datetime.timezone.utc).timestamp(), False
+    moment = datetime.datetime.strptime(value, "%Y%m%dT%H%M%S")
+    tzid = params.get("TZID")
+    if tzid and ZoneInfo is not None:
+        try:
+            return moment.replace(tzinfo=ZoneInfo(tzid.strip('"'))).timestamp(), False
+        except (ZoneInfoNotFoundError, ValueError):
+            if unresolved is not None and tz_database_missing():
+                unresolved.add(tzid.strip('"'))
+    return moment.timestamp(), False
+
+
+def _duration(value):
+    """ RFC 5545 DURATION such as ``PT1H30M`` or ``P1D`` in seconds. """
+    sign = -1 if value.startswith("-") else 1
+    value = value.lstrip("+-").lstrip("P")
+    seconds, number, in_time = 0, "", False
+    units = {"W": 604800, "D": 86400}
+    time_units = {"H": 3600, "M": 60, "S": 1}
+    for char in value:
+        if char == "T":
+            in_time = True
+        elif char.isdigit():
+            number += char
+        else:
+            table = time_units if in_time else units
+            if char not in table:
+                raise ValueError(f"bad DURATION {value!r}")
+            seconds += int(number or 0) * table[char]
+            number = ""
+    return sign * seconds
+
+
+def _expand(start, end, rule, exdates, window):
+    """ Occurrences of a recurring event that fall inside ``window``. """
+    parts = dict(p.split("=", 1) for p in rule.split(";") if "=" in p)
+    freq = parts.get("FREQ")
+    if freq not in ("DAILY", "WEEKLY"):
+        return [(start, end)] if start < window[1] and end > window[0] else []
+    interval = int(parts.get("INTERVAL", 1))
+    if interval < 1:
+        raise ValueError(f"bad RRULE INTERVAL {interval}")
+    count = int(parts["COUNT"]) if "COUNT" in parts else None
+    until = _timestamp(parts["UNTIL"], {})[0] if "UNTIL" in parts else None
+    length = end - start
+    first = datetime.datetime.fromtimestamp(start)
+    if freq == "WEEKLY" and "BYDAY" in parts:
+        weekdays = sorted(_WEEKDAYS[d[-2:]] for d in parts["BYDAY"].split(","))
+    elif freq == "WEEKLY":
+        weekdays = [first.weekday()]
+    else:
+        weekdays = None
+    occurrences = []
+    produced = 0
+    step = 0
+    # Walk whole periods (days or weeks) in local time so DST shifts keep
+    # the wall-clock start time.
+    while True:
+        if weekdays is None:
+            candidates = [first + datetime.timedelta(days=step * interval)]
+        else:
+            week = first - datetime.timedelta(days=first.weekday()) + datetime.timedelta(weeks=step * interval)
+            candidates = [week + datetime.timedelta(days=d) for d in weekdays]
+        for moment in candidates:
+            if moment < first:
+                continue
+            ts = moment.timestamp()
+            if (until is not None and ts > until) or (count is not None and produced >= count) \
+                    or ts >= window[1]:
+                return occurrences
+            produced += 1
+            if ts not in exdates and ts + length > window[0]:
+                occurrences.append((ts, ts + length))
+        step += 1
+
+
+def parse_ics(path, window, unresolved=None):
+    """ Busy ``(start, end)`` timestamps from ``path`` overlapping ``window``.
+
+    TZIDs read as local time for lack of a timezone database are added to
+    the set ``unresolved``.
+    """
+    busy = []
+    event = None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in _unfolded_lines(f):
+            name, params, value = _split(line)
+            if name == "BEGIN" and value.upper() == "VEVENT":
+                event = {"exdates": set()}
+            elif event is None:
+                continue
+            elif name == "END" and value.upper() == "VEVENT":
+                if not event.get("bad"):
+                    try:
+                        busy.extend(_event_intervals(event, window))
+                    except _BAD_VALUE:
+                        pass
+                event = None
+            else:
+                try:
+                    _parse_property(event, name, params, value, unresolved)
+                except _BAD_VALUE:
+                    event["bad"] = True
+    return busy
+
+
+def _parse_property(event, name, params, value, unresolved=None):
+    if name in ("DTSTART", "DTEND"):
+        event[name] = _timestamp(value, params, unresolved)
+    elif name == "DURATION":
+        event[name] = _duration(value)
+    elif name == "EXDATE":
+        for item in value.split(","):
+            event["exdates"].add(_timestamp(item, params, unresolved)[0])
+    elif name in ("RRULE", "TRANSP", "STATUS"):
+        event[name] = value.strip().upper()
+
+
+def _event_intervals(event, window):
+    if "DTSTART" not in event or event.get("TRANSP") == "TRANSPARENT" \
+            or event.get("STATUS") == "CANCELLED":
+        return []
+    start, all_day = event["DTSTART"]
+    if "DTEND" in event:
+        end = event["DTEND"][0]
+    elif "DURATION" in event:
+        end = start + event["DURATION"]
+    else:
+        end = start + (86400 if all_day else 0)
+    if "RRULE" in event:
+        return _expand(start, end, event["RRULE"], event["exdates"], window)
+    if start < window[1] and end > window[0]:
+        return [(start, end)]
+    return []
+
+
+class CalendarSet:
+    """ Busy intervals from several .ics files, re-indexed as files change. """
+
+    def __init__(self, paths, horizon_days=HORIZON_DAYS, refresh_interval=REFRESH_INTERVAL):
+        self.paths = list(paths)
+        self.horizon = horizon_days * 86400
+        self.refresh_interval = refresh_interval
+        self.files = {}
+        self.tree = IntervalTree([])
+        self.window = (0.0, 0.0)
+        self.unresolved = set()
+        self._checked = float("-inf")
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        now = time.time()
+        if not force and time.monotonic() - self._checked < self.refresh_interval:
+            return
+        self._checked = time.monotonic()
+        # Slide the expansion window before recurring events run out.
+        if now > self.window[0] + self.horizon / 2 + 86400:
+            self.window = (now - 86400, now + self.horizon)
+            self.files.clear()
+        changed = False
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                changed |= self.files.pop(path, None) is not None
+                continue
+            key = (st.st_mtime_ns, st.st_size)
+            cached = self.files.get(path)
+            if cached is not None and cached[0] == key:
+                continue
+            try:
+                self.files[path] = (key, parse_ics(path, self.window, self.unresolved))
+            except (OSError, ValueError):
+                self.files.pop(path, None)
+            changed = True
+        if changed:
+            self.tree = IntervalTree(i for _, intervals in self.files.values() for i in intervals)
+
+    def first_overlap(self, start, end):
+        """ Earliest busy ``(start, end)`` overlapping the wall-clock range, or None. """
+        self.refresh()
+        return self.tree.first_overlap(start, end)
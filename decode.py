@@ -0,0 +1,217 @@
+""" Streaming decode of alarm files to float samples for analysis.
+
+``decode(path)`` returns a ``Stream``: its sample rate and channel count,
+and when iterated, float32 NumPy arrays shaped (frames, channels) in
+[-1, 1], so a whole file never has to sit in memory at once. WAV files are read with the
+``wave`` module. Other formats are piped through ffmpeg or mpg123 when
+either is installed, and otherwise decoded by pygame on SDL's dummy audio
+driver (which, unlike the others, holds the whole file in memory while it
+is analysed).
+"""
+import os
+import shutil
+import subprocess
+import wave
+
+from audio import MIXER_LOCK, AudioError
+
+CHUNK_FRAMES = 65536
+# External decoders are asked for this format.
+PIPE_RATE = 44100
+PIPE_CHANNELS = 2
+
+
+class DecodeError(AudioError):
+    pass
+
+
+class NoDecoderError(DecodeError):
+    """ Nothing installed can decode this format; says nothing about the file. """
+
+
+class Stream:
+    """ Decoded chunks plus what is known about the file.
+
+    ``expected_frames`` is the length the file claims, when it says.
+    ``warning`` is set, once the stream is exhausted, if the decoder
+    complained after producing some audio, which usually means truncation.
+    """
+
+    def __init__(self, rate, channels, chunks, expected_frames=None):
+        self.rate = rate
+        self.channels = channels
+        self.expected_frames = expected_frames
+        self.warning = None
+        self._chunks = chunks
+
+    def __iter__(self):
+        return self._chunks
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise DecodeError("audio analysis needs numpy") from e
+    return numpy
+
+
+def _to_float(np, data, width, channels):
+    if width == 1:
+        samples = (np.frombuffer(data, np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(data, "<i2").astype(np.float32) / 32768
+    elif width == 3:
+        raw = np.frombuffer(data, np.uint8).reshape(-1, 3).astype(np.int32)
+        value = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = np.where(value >= 1 << 23, value - (1 << 24), value).astype(np.float32) / (1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(data, "<i4").astype(np.float32) / 2**31
+    else:
+        raise DecodeError(f"unsupported sample width {width}")
+    return samples.reshape(-1, channels)
+
+
+def _wav_chunks(np, w, chunk_frames):
+    with w:
+        width, channels = w.getsampwidth(), w.getnchannels()
+        while True:
+            data = w.readframes(chunk_frames)
+            if not data:
+                return
+            # A truncated file can end in the middle of a frame.
+            data = data[:len(data) - len(data) % (width * channels)]
+            if data:
+                yield _to_float(np, data, width, channels)
+
+
+def _pipe_argv(path):
+    if shutil.which("ffmpeg"):
+        return ["ffmpeg", "-v", "error", "-nostdin", "-i", path, "-f", "s16le",
+                "-ac", str(PIPE_CHANNELS), "-ar", str(PIPE_RATE), "-"]
+    if shutil.which("mpg123") and path.lower().endswith((".mp3", ".mp2")):
+        return ["mpg123", "-q", "-s", "-r", str(PIPE_RATE), "--stereo", path]
+    return None
+
+
+def _pipe_chunks(np, argv, chunk_frames, stream):
+    frame = 2 * PIPE_CHANNELS
+    process = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    try:
+        got_data = False
+        while True:
+            data = process.stdout.read(chunk_frames * frame)
+            if not data:
+                break
+            data = data[:len(data) - len(data) % frame]
+            if data:
+                got_data = True
+                yield _to_float(np, data, 2, PIPE_CHANNELS)
+        error = process.stderr.read().decode(errors="replace").strip()
+        if process.wait():
+            message = error.splitlines()[-1] if error else f"{argv[0]} failed"
+            if not got_data:
+                raise DecodeError(message)
+            stream.warning = message
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def _pygame_chunks(np, path, chunk_frames):
+    try:
+        import pygame
+    except ImportError as e:
+        raise NoDecoderError("no decoder found; install ffmpeg or pygame") from e
+    # Decoding needs an initialized mixer. An open one is reused; otherwise
+    # one is opened on SDL's dummy driver, so probes and library scans never
+    # take the audio device, and closed again. MIXER_LOCK keeps the player
+    # from opening its mixer while the dummy driver is selected.
+    with MIXER_LOCK:
+        owned = not pygame.mixer.get_init()
+        if owned:
+            saved = os.environ.get("SDL_AUDIODRIVER")
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
+            try:
+                pygame.mixer.init()
+            except pygame.error as e:
+                raise DecodeError(f"cannot decode with pygame: {e}") from e
+            finally:
+                if saved is None:
+                    del os.environ["SDL_AUDIODRIVER"]
+                else:
+                    os.environ["SDL_AUDIODRIVER"] = saved
+        try:
+            rate, size, channels = pygame.mixer.get_init()
+            data = memoryview(pygame.mixer.Sound(path).get_raw())
+        except pygame.error as e:
+            raise DecodeError(str(e)) from e
+        finally:
+            if owned:
+                pygame.mixer.quit()
+    width = abs(size) // 8
+    step = chunk_frames * width * channels
+
+    def chunks():
+        for offset in range(0, len(data), step):
+            part = data[offset:offset + step]
+            if size == 32:
+                # 32-bit mixers use float samples.
+                yield np.frombuffer(part, np.float32).reshape(-1, channels)
+            else:
+                yield _to_float(np, part, width, channels)
+    return Stream(rate, channels, chunks())
+
+
+def decode(path, chunk_frames=CHUNK_FRAMES):
+    """ Return a ``Stream`` for ``path``; see the module docstring. """
+    np = _numpy()
+    if not os.path.isfile(path):
+        raise DecodeError(f"no such file: {path}")
+    if path.lower().endswith(".wav"):
+        try:
+            w = wave.open(path, "rb")
+        except (wave.Error, EOFError) as e:
+            raise DecodeError("not a readable WAV file" + (f": {e}" if str(e) else "")) from e
+        return Stream(w.getframerate(), w.getnchannels(), _wav_chunks(np, w, chunk_frames),
+                      expected_frames=w.getnframes())
+    argv = _pipe_argv(path)
+    if argv is not None:
+        stream = Stream(PIPE_RATE, PIPE_CHANNELS, None)
+        stream._chunks = _pipe_chunks(np, argv, chunk_frames, stream)
+        return stream
+    return _pygame_chunks(np, path, chunk_frames)
+
+
+def read_pcm(path, rate, channels):
+    """ Decode ``path`` to 16-bit PCM bytes at ``rate`` and ``channels``.
+
+    Files already at ``rate`` are converted chunk by chunk; others are
+    resampled (linearly) in one piece.
+    """
+    np = _numpy()
+    stream = decode(path)
+
+    def convert(samples):
+        if samples.shape[1] != channels:
+            samples = samples.mean(axis=1, keepdims=True)
+            if channels > 1:
+                samples = np.repeat(samples, channels, axis=1)
+        return (np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes()
+
+    if stream.rate == rate:
+        return b"".join(convert(chunk) for chunk in stream)
+    parts = list(stream)
+    if not parts:
+        return b""
+    samples = np.concatenate(parts)
+    count = int(round(len(samples) * rate / stream.rate))
+    positions = np.linspace(0, max(len(samples) - 1, 0), count)
+    resampled = np.empty((count, samples.shape[1]), np.float32)
+    for channel in range(samples.shape[1]):
+        resampled[:, channel] = np.interp(positions, np.arange(len(samples)), samples[:, channel])
+    return convert(resampled)
@@ -0,0 +1,158 @@
+import time
+
+import metrics
+
+STUDY = "study"
+BREAK = "break"
+LONG_BREAK = "long break"
+BUSY = "busy"
+
+
+class PhaseEngine:
+    """ Timer state shared between the worker thread and the Tk thread.
+
+    The worker is the only writer, except for ``clear``, which the Tk
+    thread calls to stop the timer. ``state`` is replaced with a single
+    assignment of a ``(phase, deadline)`` tuple, so readers on other threads
+    always see a consistent pair without taking a lock; the worker acts on
+    the pair ``advance`` returned rather than reading ``state`` back, since
+    a stop may have cleared it in between.
+
+    With a compiled ``schedule.Plan`` the engine keeps only the clock time
+    the plan is anchored at; the current phase is looked up from the plan's
+    timeline, so skipping, pausing or waking after a long sleep never
+    replays phases one by one.
+
+    ``busy`` is an optional source of wall-clock busy periods (see
+    ``calendars.CalendarSet``). A phase that runs into one is cut short, a
+    BUSY phase covers the busy period, and the plan then resumes where it
+    was interrupted. A plan's ``until`` end does not move with it.
+    """
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep, wall=time.time, busy=None):
+        self.clock = clock
+        self.sleep = sleep
+        self.wall = wall
+        self.busy = busy
+        self.busy_since = None
+        self.state = None
+        self.started = None
+        self.plan = None
+        self.anchor = None
+        self.end_at = None
+        self.paused = None
+
+    def set(self, phase, deadline, started=None):
+        self.started = started
+        self.state = (phase, deadline)
+        return deadline
+
+    def clear(self):
+        self.state = None
+        self.plan = None
+
+    def start_plan(self, plan):
+        self.plan = plan
+        self.anchor = self.clock()
+        # ``until`` is a clock time: busy periods move the phases, not the end.
+        self.end_at = None if plan.end is None else self.anchor + plan.end
+        self.paused = None
+        self.busy_since = None
+        return self.advance()
+
+    def advance(self, now=None):
+        """ Switch to the phase the plan has in effect at ``now``.
+
+        Returns the new ``(phase, deadline)``, or None once the plan is over.
+        """
+        # Read once: clear() may drop the plan from another thread meanwhile.
+        plan = self.plan
+        if plan is None:
+            return None
+        if now is None:
+            now = self.clock()
+        if self.busy_since is not None:
+            # The plan stood still while busy.
+            self.anchor += now - self.busy_since
+            self.busy_since = None
+        if self.end_at is not None and now >= self.end_at:
+            self.state = None
+            return None
+        entry = plan.locate(now - self.anchor)
+        if entry is None:
+            self.state = None
+            return None
+        _, phase, start, end = entry
+        deadline = self.anchor + end
+        if self.end_at is not None:
+            deadline = min(deadline, self.end_at)
+        if self.busy is not None:
+            offset = self.wall() - now
+            interval = self.busy.first_overlap(now + offset, deadline + offset)
+            if interval is not None:
+                busy_start, busy_end = interval[0] - offset, interval[1] - offset
+                if busy_start <= now:
+                    self.busy_since = now
+                    if self.end_at is not None:
+                        busy_end = min(busy_end, self.end_at)
+                    self.set(BUSY, busy_end, now)
+                    return self.state
+                deadline = busy_start
+        self.set(phase, deadline, self.anchor + start)
+        return self.state
+
+    def skip(self):
+        """ End the current phase now and move to the next one. """
+        now = self.clock()
+        state = self.state
+        if state is not None and state[1] > now:
+            self.anchor -= state[1] - now
+        return self.advance(now)
+
+    def pause(self):
+        if self.plan is not None and self.paused is None:
+            self.paused = self.clock() - self.anchor
+
+    def resume(self):
+        if self.paused is not None:
+            self.anchor = self.clock() - self.paused
+            self.paused = None
+            return self.advance()
+        return self.state
+
+    def remaining(self, now=None):
+        state = self.state
+        if state is None:
+            return None
+        if now is None:
+            now = self.clock()
+        return max(0.0, state[1] - now)
+
+    def wait(self, running):
+        """ Sleep until the current phase ends, following skips while waiting.
+
+        Returns False if the phase was cleared or ``running()`` turned false.
+        """
+        while running():
+            state = self.state
+            if state is None:
+                return False
+            if self.paused is not None:
+                self.sleep(1)
+                continue
+            remaining = state[1] - self.clock()
+            if remaining <= 0:
+                metrics.PHASE_LATENESS.observe(-remaining)
+                return True
+            self.sleep(min(1, remaining))
+        return False
+
+    def wait_until(self, deadline, running):
+        """ Sleep until ``deadline``; returns False if ``running()`` turns false first. """
+        while running():
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                metrics.PHASE_LATENESS.observe(-remaining)
+                return True
+            self.sleep(min(1, remaining))
+        return False
@@ -0,0 +1,121 @@
+""" In-process event bus for timer lifecycle events.
+
+Subscribers are kept as precomputed tuples per event type, rebuilt only on
+(un)subscribe, so ``publish`` is one dict lookup when nobody listens and a
+plain loop otherwise. Handlers subscribed with ``queued=True`` run on a
+dispatcher thread instead of the publishing thread.
+"""
+import queue
+import threading
+import traceback
+
+
+class Event:
+    __slots__ = ()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class PhaseStarted(Event):
+    __slots__ = ("phase", "deadline")
+
+    def __init__(self, phase, deadline):
+        self.phase = phase
+        # Wall-clock time the phase ends.
+        self.deadline = deadline
+
+
+class PhaseEnded(Event):
+    __slots__ = ("phase",)
+
+    def __init__(self, phase):
+        self.phase = phase
+
+
+class AlarmStarted(Event):
+    __slots__ = ("sound", "reasons")
+
+    def __init__(self, sound, reasons=()):
+        self.sound = sound
+        # Why the alarm rang, e.g. the phases that ended; several if
+        # alarms that fired together were merged.
+        self.reasons = reasons
+
+
+class AlarmStopped(Event):
+    __slots__ = ()
+
+
+class TimerStopped(Event):
+    __slots__ = ()
+
+
+class SettingsChanged(Event):
+    __slots__ = ("name", "value")
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class EventBus:
+    def __init__(self):
+        self._handlers = {}
+        self._sync = {}
+        self._queued = {}
+        self._lock = threading.Lock()
+        self._queue = None
+
+    def subscribe(self, event_type, handler, queued=False):
+        with self._lock:
+            # The queue must exist before publish can see a queued handler.
+            if queued and self._queue is None:
+                self._queue = queue.SimpleQueue()
+                threading.Thread(target=self._dispatch, name="event-bus", daemon=True).start()
+            self._handlers.setdefault(event_type, []).append((handler, queued))
+            self._rebuild(event_type)
+
+    def unsubscribe(self, event_type, handler):
+        with self._lock:
+            handlers = self._handlers.get(event_type, [])
+            handlers[:] = [entry for entry in handlers if entry[0] != handler]
+            self._rebuild(event_type)
+
+    def _rebuild(self, event_type):
+        handlers = self._handlers.get(event_type, [])
+        sync = tuple(h for h, queued in handlers if not queued)
+        queued = tuple(h for h, queued in handlers if queued)
+        # Types without handlers are removed so publish stays a failed lookup.
+        for table, value in ((self._sync, sync), (self._queued, queued)):
+            if value:
+                table[event_type] = value
+            else:
+                table.pop(event_type, None)
+
+    def wants(self, event_type):
+        """ Whether anyone listens, to skip building events nobody receives. """
+        return event_type in self._sync or event_type in self._queued
+
+    def publish(self, event):
+        event_type = type(event)
+        handlers = self._sync.get(event_type)
+        if handlers is not None:
+            for handler in handlers:
+                try:
+                    handler(event)
+                except Exception:
+                    traceback.print_exc()
+        handlers = self._queued.get(event_type)
+        if handlers is not None:
+            self._queue.put((handlers, event))
+
+    def _dispatch(self):
+        while True:
+            handlers, event = self._queue.get()
+            for handler in handlers:
+                try:
+                    handler(event)
+                except Exception:
+                    traceback.print_exc()
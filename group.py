@@ -0,0 +1,205 @@
+""" LAN group sessions: one leader announces phase deadlines to followers.
+
+Followers estimate their clock offset from the leader NTP-style and keep
+the sample with the smallest round-trip delay out of the most recent few,
+then schedule alarms on their own clock. Traffic is a sync exchange every
+``SYNC_INTERVAL`` seconds plus one announcement per phase (repeated at the
+sync interval for late joiners and lost datagrams), all as JSON over UDP.
+Followers register with the leader through their sync requests, so no
+multicast routing is needed and everything works on loopback.
+"""
+import json
+import socket
+import threading
+import time
+
+DEFAULT_PORT = 47474
+SYNC_INTERVAL = 30.0
+# Quick exchanges right after joining so the first offset estimate is good.
+INITIAL_SYNCS = 5
+INITIAL_SYNC_SPACING = 0.2
+OFFSET_SAMPLES = 8
+
+
+def _send(sock, addr, message):
+    try:
+        sock.sendto(json.dumps(message).encode(), addr)
+    except OSError:
+        pass
+
+
+class GroupLeader:
+    def __init__(self, host="0.0.0.0", port=DEFAULT_PORT, clock=time.time,
+                 reannounce=SYNC_INTERVAL):
+        self.clock = clock
+        self.reannounce = reannounce
+        # Followers are forgotten after missing a few sync rounds.
+        self.follower_ttl = 3 * SYNC_INTERVAL + 5
+        self.followers = {}
+        self.seq = 0
+        self.current = {"t": "stop", "seq": 0}
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+        self.sock.settimeout(reannounce)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._serve, name="group-leader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def announce(self, phase, deadline):
+        """ Announce that ``phase`` ends at wall-clock time ``deadline`` (leader clock). """
+        with self._lock:
+            self.seq += 1
+            self.current = {"t": "phase", "seq": self.seq, "phase": phase, "deadline": deadline}
+        self._broadcast()
+
+    def stop(self):
+        with self._lock:
+            self.seq += 1
+            self.current = {"t": "stop", "seq": self.seq}
+        self._broadcast()
+
+    def _broadcast(self):
+        message = self.current
+        now = time.monotonic()
+        for addr, seen in list(self.followers.items()):
+            if now - seen > self.follower_ttl:
+                self.followers.pop(addr, None)
+            else:
+                _send(self.sock, addr, message)
+
+    def _serve(self):
+        last = time.monotonic()
+        while not self._closed:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except socket.timeout:
+                data = None
+            except OSError:
+                return
+            if data is not None:
+                t1 = self.clock()
+                try:
+                    request = json.loads(data)
+                except ValueError:
+                    continue
+                if request.get("t") != "sync":
+                    continue
+                new = addr not in self.followers
+                self.followers[addr] = time.monotonic()
+                _send(self.sock, addr, {"t": "sync", "t0": request.get("t0"), "t1": t1,
+                                        "t2": self.clock()})
+                if new:
+                    _send(self.sock, addr, self.current)
+            if time.monotonic() - last >= self.reannounce:
+                last = time.monotonic()
+                self._broadcast()
+
+    def close(self):
+        self._closed = True
+        self.sock.close()
+
+
+class GroupFollower:
+    def __init__(self, leader, clock=time.time, sync_interval=SYNC_INTERVAL):
+        self.leader = leader
+        self.clock = clock
+        self.sync_interval = sync_interval
+        self.samples = []
+        self.offset = None
+        self.delay = None
+        self.seq = None
+        self.current = None
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("", 0))
+        self.sock.settimeout(1.0)
+        self._threads = [threading.Thread(target=self._receive, name="group-follower", daemon=True),
+                         threading.Thread(target=self._sync_loop, name="group-sync", daemon=True)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _sync_loop(self):
+        for _ in range(INITIAL_SYNCS):
+            self._send_sync()
+            if self._closed.wait(INITIAL_SYNC_SPACING):
+                return
+        while not self._closed.wait(self.sync_interval):
+            self._send_sync()
+
+    def _send_sync(self):
+        _send(self.sock, self.leader, {"t": "sync", "t0": self.clock()})
+
+    def _receive(self):
+        while not self._closed.is_set():
+            try:
+                data, _ = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            t3 = self.clock()
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            kind = message.get("t")
+            if kind == "sync" and message.get("t0") is not None:
+                self._add_sample(message["t0"], message["t1"], message["t2"], t3)
+            elif kind in ("phase", "stop"):
+                with self._cond:
+                    if message["seq"] != self.seq:
+                        self.seq = message["seq"]
+                        self.current = message
+                        self._cond.notify_all()
+
+    def _add_sample(self, t0, t1, t2, t3):
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        delay = (t3 - t0) - (t2 - t1)
+        self.samples.append((delay, offset))
+        del self.samples[:-OFFSET_SAMPLES]
+        with self._cond:
+            self.delay, self.offset = min(self.samples)
+            self._cond.notify_all()
+
+    def local_deadline(self, leader_deadline):
+        """ Leader wall-clock time converted to this machine's wall clock. """
+        return leader_deadline - (self.offset or 0.0)
+
+    def wait_announcement(self, after_seq, timeout=None):
+        """ Next announcement with a sequence other than ``after_seq``.
+
+        Returns ``(seq, phase, local_deadline)``, with ``phase`` None when the
+        leader stopped, or None on timeout. Waits for a first offset estimate.
+        """
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self.offset is not None and self.seq is not None and self.seq != after_seq,
+                timeout)
+            if not ready:
+                return None
+            message = self.current
+        if message["t"] == "stop":
+            return message["seq"], None, None
+        return message["seq"], message["phase"], self.local_deadline(message["deadline"])
+
+    def close(self):
+        self._closed.set()
+        with self._cond:
+            self._cond.notify_all()
+        self.sock.close()
+
+
+def parse_address(text, default_port=DEFAULT_PORT):
+    host, _, port = text.rpartition(":")
+    if not host:
+        return text, default_port
+    return host, int(port)
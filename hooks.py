@@ -0,0 +1,141 @@
+""" Phase-transition hooks that never hold up the timer or the UI.
+
+``emit`` only appends to a bounded queue. A small pool of worker threads
+runs Python callbacks and launches external scripts, each in its own
+process with a trimmed environment, the event as JSON on stdin, and a hard
+timeout after which the whole process group is killed. When the queue is
+full the oldest pending job is dropped, so a stuck hook costs at most its
+own slot.
+
+Hook files are JSON mapping event names to command lines::
+
+    {"phase_start": [["python", "mute_chat.py"]], "alarm_dismissed": [["notify-send", "back to work"]]}
+"""
+import collections
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+import events
+import metrics
+
+PHASE_START = "phase_start"
+PHASE_END = "phase_end"
+ALARM_DISMISSED = "alarm_dismissed"
+EVENTS = (PHASE_START, PHASE_END, ALARM_DISMISSED)
+
+HOOKS_RUN = metrics.Counter("hooks_run_total", "Hook jobs executed.")
+HOOKS_DROPPED = metrics.Counter("hooks_dropped_total", "Hook jobs dropped because the queue was full.")
+HOOKS_TIMED_OUT = metrics.Counter("hooks_timed_out_total", "Hook scripts killed after their timeout.")
+HOOKS_FAILED = metrics.Counter("hooks_failed_total", "Hooks that raised or exited non-zero.")
+
+# Environment variables passed through to hook scripts.
+_KEEP_ENV = ("PATH", "HOME", "USERPROFILE", "SYSTEMROOT", "TEMP", "TMP", "LANG", "DISPLAY",
+             "DBUS_SESSION_BUS_ADDRESS", "XDG_RUNTIME_DIR")
+
+
+class HookRunner:
+    def __init__(self, workers=2, queue_size=32, timeout=10.0):
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.callbacks = {event: [] for event in EVENTS}
+        self.scripts = {event: [] for event in EVENTS}
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = [threading.Thread(target=self._work, name=f"hooks-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def register(self, event, callback):
+        """ Call ``callback(event, payload)`` on a hook worker thread. """
+        self.callbacks[event].append(callback)
+
+    def register_script(self, event, argv):
+        self.scripts[event].append(list(argv))
+
+    def load(self, path):
+        with open(path) as f:
+            config = json.load(f)
+        for event, commands in config.items():
+            if event not in self.scripts:
+                raise ValueError(f"unknown hook event {event!r}")
+            for argv in commands:
+                self.register_script(event, argv)
+
+    def attach(self, bus):
+        """ Feed the hooks from an ``events.EventBus``. """
+        bus.subscribe(events.PhaseStarted,
+                      lambda e: self.emit(PHASE_START, phase=e.phase, deadline=e.deadline))
+        bus.subscribe(events.PhaseEnded, lambda e: self.emit(PHASE_END, phase=e.phase))
+        bus.subscribe(events.AlarmStopped, lambda e: self.emit(ALARM_DISMISSED))
+
+    def emit(self, event, **payload):
+        jobs = [(callback, event, payload) for callback in self.callbacks[event]]
+        jobs += [(argv, event, payload) for argv in self.scripts[event]]
+        if not jobs:
+            return
+        with self._cond:
+            for job in jobs:
+                if len(self._queue) >= self.queue_size:
+                    self._queue.popleft()
+                    HOOKS_DROPPED.inc()
+                self._queue.append(job)
+            self._cond.notify(len(jobs))
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                target, event, payload = self._queue.popleft()
+            HOOKS_RUN.inc()
+            try:
+                if callable(target):
+                    target(event, payload)
+                else:
+                    self._run_script(target, event, payload)
+            except Exception:
+                HOOKS_FAILED.inc()
+
+    def _run_script(self, argv, event, payload):
+        env = {key: os.environ[key] for key in _KEEP_ENV if key in os.environ}
+        env["STUDYTIMER_EVENT"] = event
+        kwargs = {}
+        if sys.platform == "win32":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+        else:
+            kwargs["start_new_session"] = True
+        process = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL, env=env, **kwargs)
+        data = json.dumps(dict(payload, event=event)).encode()
+        try:
+            process.communicate(data, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            HOOKS_TIMED_OUT.inc()
+            self._kill(process)
+            return
+        if process.returncode:
+            HOOKS_FAILED.inc()
+
+    def _kill(self, process):
+        try:
+            if sys.platform == "win32":
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        process.wait()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._cond.notify_all()
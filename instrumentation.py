@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bucket bounds in milliseconds, roughly doubling.
+DEFAULT_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """ Upper bucket bound below which at least ``q`` of observations fall. """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= target:
+                return float(bound)
+        return self.max
+
+
+class UiMonitor:
+    """ Opt-in measurements of Tk event-loop responsiveness.
+
+    A heartbeat scheduled with ``after`` records how late the mainloop runs
+    it, and callbacks wrapped with ``wrap`` record their own run time. All
+    values are in milliseconds. When disabled every method is a no-op and
+    ``wrap`` returns the callback unchanged.
+    """
+
+    def __init__(self, root, enabled=False, path=None, interval=100, dump_every=10.0,
+                 report=True):
+        self.root = root
+        self.enabled = enabled
+        self.report_enabled = report
+        self.path = path
+        self.interval = interval
+        self.dump_every = dump_every
+        self.histograms = {}
+        self._expected = None
+        self._last_dump = 0.0
+
+    def histogram(self, name):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram()
+        return hist
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._expected = time.perf_counter() + self.interval / 1000
+        self.root.after(self.interval, self._beat)
+
+    def _beat(self):
+        now = time.perf_counter()
+        self.histogram("tk_loop_lag").observe(max(0.0, now - self._expected) * 1000)
+        if self.path and now - self._last_dump >= self.dump_every:
+            self._last_dump = now
+            self.dump()
+        self._expected = time.perf_counter() + self.interval / 1000
+        self.root.after(self.interval, self._beat)
+
+    def wrap(self, name, callback):
+        if not self.enabled:
+            return callback
+        hist = self.histogram(name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                hist.observe((time.perf_counter() - start) * 1000)
+        return timed
+
+    @contextmanager
+    def time(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).observe((time.perf_counter() - start) * 1000)
+
+    def report(self):
+        lines = []
+        for name in sorted(self.histograms):
+            hist = self.histograms[name]
+            mean = hist.sum / hist.count if hist.count else 0.0
+            lines.append(f"{name}: count={hist.count} mean={mean:.2f}ms "
+                         f"p50<={hist.quantile(0.5):g}ms p99<={hist.quantile(0.99):g}ms "
+                         f"max={hist.max:.2f}ms")
+            buckets = " ".join(f"le{bound}={n}" for bound, n in zip(hist.bounds, hist.counts))
+            lines.append(f"  {buckets} inf={hist.counts[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self):
+        """ Write the report to ``path`` (replaced atomically so it can be scraped), or stderr. """
+        if not self.enabled or not self.report_enabled:
+            return
+        text = self.report()
+        if not self.path:
+            print(text, end="", file=sys.stderr)
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, self.path)
@@ -0,0 +1,159 @@
+""" A searchable index of the user's alarm sounds.
+
+``scan`` walks the configured directories and probes new or changed files
+in a process pool (decoding is CPU-bound), reusing every entry whose mtime
+and size are unchanged. Each probe also stores the file's waveform
+thumbnail. The index is a JSON file in the user cache
+directory.
+
+``Library.search`` answers as-you-type queries: file names that start with
+the query come first (binary search over sorted names), then names that
+contain it, then fuzzy matches where the query's characters appear in
+order. Substring and fuzzy matching each run as one regex scan over all
+names joined into a single string, so a query over 10k files takes a
+couple of milliseconds.
+"""
+import bisect
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import storage
+
+EXTENSIONS = (".mp3", ".wav", ".ogg", ".flac", ".opus", ".m4a")
+FIELDS = ("mtime_ns", "size", "duration", "rate", "channels", "level", "error")
+
+
+def _probe_file(path):
+    # Runs in a worker process. The waveform thumbnail comes from the same
+    # decode, so browsing the library never decodes a file again.
+    from probe import probe
+    import thumbnails
+    try:
+        st = os.stat(path)
+        try:
+            accumulator = thumbnails.Accumulator()
+        except ImportError:
+            # No numpy: the probe still checks the file, without a thumbnail.
+            accumulator = None
+        result = probe(path, observers=(accumulator.add,) if accumulator else ())
+        if accumulator is not None and result.measured:
+            thumbnails.store(path, *accumulator.finish(), st=st)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    return {"duration": result.duration, "rate": result.rate, "channels": result.channels,
+            "level": result.level, "error": result.error}
+
+
+def _walk(directories):
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if name.lower().endswith(EXTENSIONS):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_mtime_ns, st.st_size
+
+
+def index_path():
+    return os.path.join(storage.cache_dir(), "library.json")
+
+
+def scan(directories, path=None, workers=None, index=None):
+    """ Bring the index for ``directories`` up to date and return it.
+
+    The index maps absolute paths to dicts with the keys in ``FIELDS``.
+    """
+    path = path or index_path()
+    old = index if index is not None else storage.read_json(path, {})
+    new = {}
+    todo = []
+    for file, mtime_ns, size in _walk(os.path.abspath(d) for d in directories):
+        entry = old.get(file)
+        if entry is not None and entry.get("mtime_ns") == mtime_ns and entry.get("size") == size:
+            new[file] = entry
+        else:
+            new[file] = {"mtime_ns": mtime_ns, "size": size}
+            todo.append(file)
+    if todo:
+        # Spawned, not forked: the app has Tk and several threads running, and
+        # a fork taken while one of them holds a lock can hang a worker.
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            for file, info in zip(todo, pool.map(_probe_file, todo, chunksize=8)):
+                new[file].update(info)
+    if new != old:
+        storage.write_json(path, new)
+    return new
+
+
+def load(path=None):
+    return storage.read_json(path or index_path(), {})
+
+
+class Library:
+    def __init__(self, index):
+        self.index = index
+        entries = sorted((os.path.basename(p).lower(), p) for p in index)
+        self.names = [name for name, _ in entries]
+        self.paths = [p for _, p in entries]
+        self._text = "\n".join(self.names)
+        # Offset of each name in _text, to map regex matches back to entries.
+        self._starts = []
+        offset = 0
+        for name in self.names:
+            self._starts.append(offset)
+            offset += len(name) + 1
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _line(self, pos):
+        return bisect.bisect_right(self._starts, pos) - 1
+
+    def search(self, query, limit=50):
+        """ Paths matching ``query``, best first: prefix, then substring, then fuzzy. """
+        query = query.strip().lower().replace("\n", "")
+        if not query:
+            return self.paths[:limit]
+        found = []
+        seen = set()
+
+        def add(i):
+            if i not in seen:
+                seen.add(i)
+                found.append(i)
+
+        lo = bisect.bisect_left(self.names, query)
+        hi = bisect.bisect_left(self.names, query + "\uffff", lo)
+        for i in range(lo, min(hi, lo + limit)):
+            add(i)
+        if len(found) < limit:
+            for match in re.finditer(re.escape(query), self._text):
+                add(self._line(match.start()))
+                if len(found) >= limit:
+                    break
+        if len(found) < limit:
+            # "abc" -> a[^\nb]*b[^\nc]*c: each class stops at the next wanted
+            # character, so the regex never backtracks within a name.
+            pattern = re.escape(query[0]) + "".join(
+                f"[^\\n{re.escape(c)}]*{re.escape(c)}" for c in query[1:])
+            fuzzy = {}
+            for match in re.finditer(pattern, self._text):
+                i = self._line(match.start())
+                if i not in seen:
+                    # Tighter matches rank higher.
+                    span = match.end() - match.start()
+                    if span < fuzzy.get(i, (span + 1,))[0]:
+                        fuzzy[i] = (span, len(self.names[i]))
+            for *_, i in sorted(key + (i,) for i, key in fuzzy.items())[:limit - len(found)]:
+                add(i)
+        return [self.paths[i] for i in found[:limit]]
+
+    def info(self, path):
+        return self.index.get(path, {})
@@ -0,0 +1,124 @@
+""" Loudness normalization for alarm files.
+
+Each file is measured once: the decoded samples are cut into 400 ms blocks
+and their mean square is computed chunk by chunk with NumPy, and then the
+blocks are gated the way BS.1770 / LUFS gates them (an absolute gate at
+-70 dB, then a relative gate 10 dB below the mean). No K-weighting is
+applied, so the result is a gated RMS in dBFS.
+
+Results are stored by a hash of the file's contents, so a renamed or copied
+file is not measured again, and they persist in the user cache directory.
+At play time ``gain`` is a stat call and a dictionary lookup. Backends can
+only attenuate, so loud files are turned down to ``target`` and quiet ones
+play at full volume.
+"""
+import hashlib
+import os
+import threading
+
+import storage
+from decode import decode
+
+TARGET_DBFS = -20.0
+MIN_GAIN = 0.05
+BLOCK_SECONDS = 0.4
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def block_powers(rate, chunks, block_seconds=BLOCK_SECONDS):
+    """ Mean square of each ``block_seconds`` block, fed chunk by chunk. """
+    import numpy as np
+    block = max(1, int(rate * block_seconds))
+    powers = []
+    carry = None
+    for chunk in chunks:
+        if carry is not None and len(carry):
+            chunk = np.concatenate((carry, chunk))
+        usable = len(chunk) - len(chunk) % block
+        if usable:
+            squared = np.square(chunk[:usable], dtype=np.float64)
+            powers.append(squared.reshape(usable // block, -1).mean(axis=1))
+        carry = chunk[usable:]
+    if not powers and carry is not None and len(carry):
+        # Shorter than one block: measure what there is.
+        powers.append(np.square(carry, dtype=np.float64).mean(keepdims=True))
+    return np.concatenate(powers) if powers else np.zeros(0)
+
+
+def gated_loudness(powers):
+    """ Gated loudness in dBFS of block powers, or None for silence. """
+    import numpy as np
+    with np.errstate(divide="ignore"):
+        levels = 10 * np.log10(powers)
+    powers = powers[levels > ABSOLUTE_GATE]
+    if not len(powers):
+        return None
+    relative = 10 * np.log10(powers.mean()) + RELATIVE_GATE
+    with np.errstate(divide="ignore"):
+        powers = powers[10 * np.log10(powers) > relative]
+    return float(10 * np.log10(powers.mean()))
+
+
+def measure(path):
+    stream = decode(path)
+    return gated_loudness(block_powers(stream.rate, stream))
+
+
+class LoudnessCache:
+    def __init__(self, path=None, target=TARGET_DBFS):
+        self.path = path or os.path.join(storage.cache_dir(), "loudness.json")
+        self.target = target
+        # content digest -> loudness in dBFS (None for a silent file)
+        self.levels = storage.read_json(self.path, {})
+        # (path, mtime_ns, size) -> digest, so unchanged files are not rehashed
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def _key(self, path):
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+    def digest(self, path):
+        key = self._key(path)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = self._digests[key] = file_digest(path)
+        return digest
+
+    def analyze(self, path):
+        """ Measure ``path`` unless its contents were measured before; returns the gain. """
+        digest = self.digest(path)
+        if digest not in self.levels:
+            self.store(path, measure(path))
+        return self.gain_for(self.levels[digest])
+
+    def store(self, path, level):
+        """ Record a level measured elsewhere, e.g. by the alarm-file probe. """
+        digest = self.digest(path)
+        with self._lock:
+            self.levels[digest] = level
+            storage.write_json(self.path, self.levels)
+
+    def gain(self, path, default=1.0):
+        """ The cached gain for ``path``; never decodes or hashes. """
+        try:
+            digest = self._digests.get(self._key(path))
+        except OSError:
+            return default
+        if digest is None or digest not in self.levels:
+            return default
+        return self.gain_for(self.levels[digest])
+
+    def gain_for(self, level):
+        if level is None:
+            return 1.0
+        return min(1.0, max(MIN_GAIN, 10 ** ((self.target - level) / 20)))
@@ -0,0 +1,198 @@
+""" Counters, gauges and histograms exposed in Prometheus text format.
+
+Metrics live in a module-level registry and are always cheap to update;
+they are only rendered when scraped over HTTP (``serve``) or written to a
+node-exporter textfile-collector path (``start_textfile_writer``).
+"""
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from instrumentation import Histogram as _Buckets
+
+PREFIX = "studytimer_"
+LATENCY_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, registry=REGISTRY):
+        self.name = PREFIX + name
+        self.help = help
+        self.value = 0
+        registry.register(self)
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        return [f"{self.name} {self.value}"]
+
+
+class Gauge:
+    """ A settable value, or one computed at scrape time when ``func`` is given. """
+    type = "gauge"
+
+    def __init__(self, name, help, func=None, registry=REGISTRY):
+        self.name = PREFIX + name
+        self.help = help
+        self.func = func
+        self.value = 0
+        registry.register(self)
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def samples(self):
+        value = self.func() if self.func is not None else self.value
+        return [f"{self.name} {value}"]
+
+
+class Histogram:
+    """ Prometheus view of a bucketed histogram.
+
+    ``source`` lets an existing ``instrumentation.Histogram`` be exported, with
+    ``scale`` converting its unit (e.g. 0.001 for milliseconds to seconds).
+    """
+    type = "histogram"
+
+    def __init__(self, name, help, bounds=LATENCY_BOUNDS, source=None, scale=1.0,
+                 registry=REGISTRY):
+        self.name = PREFIX + name
+        self.help = help
+        self.source = source
+        self.scale = scale
+        self.buckets = _Buckets(bounds) if source is None else None
+        registry.register(self)
+
+    def observe(self, value):
+        self.buckets.observe(value)
+
+    def samples(self):
+        hist = self.buckets if self.source is None else self.source()
+        if hist is None:
+            return []
+        lines = []
+        cumulative = 0
+        for bound, n in zip(hist.bounds, hist.counts):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{{le="{bound * self.scale:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {hist.count}')
+        lines.append(f"{self.name}_sum {hist.sum * self.scale:g}")
+        lines.append(f"{self.name}_count {hist.count}")
+        return lines
+
+
+def rss_bytes():
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize
+    # Peak rather than current RSS, but the best the stdlib offers elsewhere.
+    import resource
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+PHASE_LATENESS = Histogram("phase_deadline_lateness_seconds",
+                           "How late phase deadlines were noticed by the timer engine.")
+ALARM_DECODE = Histogram("alarm_decode_seconds", "Time spent loading/decoding the alarm sound.")
+ALARM_PLAY = Histogram("alarm_play_seconds", "Time spent starting alarm playback.")
+AUDIO_CACHE_HITS = Counter("audio_cache_hits_total", "Alarm sounds served from the audio cache.")
+AUDIO_CACHE_MISSES = Counter("audio_cache_misses_total", "Alarm sounds that had to be decoded.")
+ACTIVE_TIMERS = Gauge("active_timers", "Timers currently running.")
+WORKER_THREADS = Gauge("threads", "Live Python threads, including timer workers.",
+                       func=threading.active_count)
+RSS = Gauge("resident_memory_bytes", "Resident set size of the process.", func=rss_bytes)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """ Serve ``/metrics`` from a daemon thread; returns the server. """
+    handler = type("Handler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_textfile(path, registry=REGISTRY):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+def start_textfile_writer(path, interval=15.0, registry=REGISTRY):
+    """ Rewrite ``path`` every ``interval`` seconds from a daemon thread. """
+    stop = threading.Event()
+
+    def loop():
+        while True:
+            write_textfile(path, registry)
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=loop, name="metrics-textfile", daemon=True).start()
+    return stop
@@ -0,0 +1,121 @@
+""" Sharing the mixer between sounds, and merging alarms that coincide.
+
+``ChannelPool`` hands out mixer channels by priority: a free channel if
+there is one, otherwise the oldest channel playing something of lower
+priority, otherwise nothing. Every sound the app plays today is an alarm
+(``PRIORITY_ALARM``), so an alarm never cuts off another one; a caller
+passing a lower priority gets a channel only while one is free and gives
+way to alarms.
+
+``AlarmCoalescer`` turns alarms that fire within ``window`` seconds of each
+other into a single playback. The first alarm plays at once; the rest only
+add their reason, and one notification carrying every reason goes out when
+the window closes.
+"""
+import threading
+import time
+
+import metrics
+
+PRIORITY_ALARM = 1
+
+ALARMS_COALESCED = metrics.Counter("alarms_coalesced_total",
+                                   "Alarms merged into one that was already playing.")
+CHANNELS_STOLEN = metrics.Counter("mixer_channels_stolen_total",
+                                  "Sounds cut off to make room for a higher-priority sound.")
+
+
+class ChannelPool:
+    """ Priority allocation over objects with ``get_busy()`` and ``stop()``. """
+
+    def __init__(self, channels, clock=time.monotonic):
+        self.channels = list(channels)
+        self.clock = clock
+        self.priorities = [0] * len(self.channels)
+        self.started = [0.0] * len(self.channels)
+        self._lock = threading.Lock()
+
+    def acquire(self, priority=PRIORITY_ALARM):
+        """ A channel to play a ``priority`` sound on, or None if all are more important. """
+        with self._lock:
+            index = None
+            for i, channel in enumerate(self.channels):
+                if not channel.get_busy():
+                    index = i
+                    break
+            else:
+                lower = [i for i in range(len(self.channels)) if self.priorities[i] < priority]
+                if not lower:
+                    return None
+                index = min(lower, key=lambda i: (self.priorities[i], self.started[i]))
+                self.channels[index].stop()
+                CHANNELS_STOLEN.inc()
+            self.priorities[index] = priority
+            self.started[index] = self.clock()
+            return self.channels[index]
+
+    def busy(self):
+        return any(channel.get_busy() for channel in self.channels)
+
+    def stop(self):
+        for channel in self.channels:
+            channel.stop()
+
+
+class AlarmCoalescer:
+    """ ``fire(sound, reason)`` calls ``play(sound)`` unless an alarm is already
+    within its window, and ``notify(sound, reasons)`` once the window closes.
+
+    Windows are timed with ``clock`` and waited out with ``sleep`` on one
+    long-lived thread, so a virtual clock drives them like everything else.
+    """
+
+    def __init__(self, play, notify, window=1.0, clock=time.monotonic, sleep=time.sleep):
+        self.play = play
+        self.notify = notify
+        self.window = window
+        self.clock = clock
+        self.sleep = sleep
+        self._group = None
+        self._lock = threading.Lock()
+        self._pending = threading.Condition(self._lock)
+        self._thread = None
+
+    def fire(self, sound, reason=None):
+        """ Returns True if this alarm played, False if it was merged. """
+        if self.window <= 0:
+            self.play(sound)
+            self.notify(sound, (reason,))
+            return True
+        with self._lock:
+            group = self._group
+            if group is not None and self.clock() - group[0] < self.window:
+                group[2].append(reason)
+                ALARMS_COALESCED.inc()
+                return False
+            # A closed window the flusher has not got to yet is sent from here.
+            closed = group
+            self._group = (self.clock(), sound, [reason])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flusher, name="alarm-coalescer",
+                                                daemon=True)
+                self._thread.start()
+            self._pending.notify()
+        if closed is not None:
+            self.notify(closed[1], tuple(closed[2]))
+        self.play(sound)
+        return True
+
+    def _flusher(self):
+        while True:
+            with self._lock:
+                while self._group is None:
+                    self._pending.wait()
+                group = self._group
+                remaining = group[0] + self.window - self.clock()
+                if remaining <= 0:
+                    self._group = None
+            if remaining > 0:
+                self.sleep(remaining)
+            else:
+                self.notify(group[1], tuple(group[2]))
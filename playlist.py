@@ -0,0 +1,134 @@
+""" Music for breaks.
+
+``BreakPlaylist.start(until)`` plays tracks from the playlist until the
+break is over and stops at its deadline. A single thread does the work:
+it waits for the alarm to finish, decodes a track, hands it to the
+backend's ``queue_pcm`` and decodes the next one while the first plays, so
+the next track is always queued before the current one ends. The backend
+switches between them itself, which makes transitions gapless, and the
+timer thread never waits on a decode. The position in the playlist carries
+over from one break to the next.
+"""
+import os
+import threading
+import time
+
+from audio import AudioError
+from decode import read_pcm
+from library import EXTENSIONS
+
+# Longest the alarm may keep the playlist waiting.
+ALARM_GRACE = 30.0
+
+
+def load_tracks(path):
+    """ Tracks in a directory (sorted, recursively) or listed in an .m3u file. """
+    if os.path.isdir(path):
+        tracks = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            tracks += [os.path.join(dirpath, name) for name in sorted(filenames)
+                       if name.lower().endswith(EXTENSIONS)]
+        return tracks
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8-sig") as f:
+        return [os.path.join(base, line.strip()) for line in f
+                if line.strip() and not line.startswith("#")]
+
+
+class BreakPlaylist:
+    def __init__(self, audio, tracks, clock=time.monotonic, on_error=None):
+        """ ``on_error(message)`` is called, from the playlist's thread, the
+        first time no track can be played. """
+        self.audio = audio
+        self.tracks = list(tracks)
+        self.clock = clock
+        self.on_error = on_error
+        self.position = 0
+        self.errors = []
+        self._reported = False
+        self._stop = None
+        # Held while queueing, so a stop never lands between the check and the queue.
+        self._lock = threading.Lock()
+
+    def start(self, until):
+        """ Play until ``until()``, a deadline on ``clock``, passes or returns None. """
+        self.stop()
+        if not self.tracks:
+            return
+        self._stop = stop = threading.Event()
+        threading.Thread(target=self._run, args=(until, stop), name="break-playlist",
+                         daemon=True).start()
+
+    def stop(self):
+        """ Stop the music now; called by the timer thread at the deadline. """
+        with self._lock:
+            stop, self._stop = self._stop, None
+            if stop is not None and not stop.is_set():
+                stop.set()
+                self.audio.stop()
+
+    def _wait(self, until, stop, moment):
+        """ Sleep until ``moment``; False once the break is over or stopped. """
+        while not stop.is_set():
+            deadline = until()
+            now = self.clock()
+            if deadline is None or now >= deadline:
+                return False
+            if now >= moment:
+                return True
+            # Re-read the deadline at least once a second, like PhaseEngine.wait.
+            stop.wait(min(moment, deadline, now + 1.0) - now)
+        return False
+
+    def _next(self, rate, channels, stop):
+        # Skip unreadable tracks, but give up after one full round of them.
+        for _ in range(len(self.tracks)):
+            if stop.is_set():
+                return None
+            track = self.tracks[self.position % len(self.tracks)]
+            self.position += 1
+            try:
+                return read_pcm(track, rate, channels)
+            except (AudioError, OSError) as e:
+                self.errors.append((track, str(e)))
+                del self.errors[:-10]
+        if not stop.is_set():
+            track, error = self.errors[-1]
+            self._report(f"none of the {len(self.tracks)} tracks could be played "
+                         f"(last: {os.path.basename(track)}: {error})")
+        return None
+
+    def _report(self, message):
+        if self.on_error is not None and not self._reported:
+            self._reported = True
+            self.on_error(message)
+
+    def _run(self, until, stop):
+        grace = self.clock() + ALARM_GRACE
+        while self.audio.busy() and self.clock() < grace:
+            if not self._wait(until, stop, self.clock() + 0.1):
+                return
+        try:
+            rate, channels = self.audio.pcm_format()
+            bytes_per_second = 2 * channels * rate
+            ends = self.clock()
+            while True:
+                data = self._next(rate, channels, stop)
+                if data is None:
+                    break
+                with self._lock:
+                    if stop.is_set():
+                        return
+                    self.audio.queue_pcm(data, rate, channels)
+                starts = max(ends, self.clock())
+                ends = starts + len(data) / bytes_per_second
+                del data
+                # Decode the next track while this one plays, as soon as it has started.
+                if not self._wait(until, stop, starts):
+                    break
+        except AudioError as e:
+            self.errors.append((None, str(e)))
+            self._report(str(e))
+        # Whatever is queued plays on until the timer thread calls stop() at
+        # the deadline; stopping from here could cut off the alarm instead.
@@ -0,0 +1,165 @@
+""" Check an alarm file long before it has to ring.
+
+``probe(path)`` decodes the whole file once, in chunks, and reports its
+duration, its peak level and whether it is silent or truncated. The same
+pass measures the gated loudness, so the caller can warm the loudness
+cache without decoding the file a second time. ``Prober`` runs probes on a
+background thread, newest request first, and hands results to a callback.
+Without NumPy or a decoder nothing can be measured; the probe then only
+checks that the file is there and readable (and, for WAV files, what its
+header says) and reports the rest as unchecked.
+"""
+import threading
+import wave
+
+from audio import AudioError
+from decode import NoDecoderError, decode
+from loudness import block_powers, gated_loudness
+
+# Peaks below this are treated as silence.
+SILENCE_DBFS = -60.0
+MIN_SECONDS = 0.05
+# A file is truncated if it decodes to less than this share of its stated length.
+TRUNCATED_RATIO = 0.98
+
+
+class ProbeResult:
+    def __init__(self, path, duration=None, rate=None, channels=None, peak_db=None,
+                 level=None, error=None, warning=None):
+        self.path = path
+        self.duration = duration
+        self.rate = rate
+        self.channels = channels
+        self.peak_db = peak_db
+        self.level = level
+        self.error = error
+        self.warning = warning
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def measured(self):
+        """ True if the file was decoded, so ``level`` and ``peak_db`` are real. """
+        return self.ok and self.peak_db is not None
+
+    def describe(self):
+        if self.error:
+            return self.error
+        if self.duration is None:
+            return self.warning or ""
+        minutes, seconds = divmod(self.duration, 60)
+        text = f"{int(minutes)}:{seconds:04.1f}, {self.rate / 1000:g} kHz, " + \
+            ("mono" if self.channels == 1 else f"{self.channels} channels")
+        if self.warning:
+            text += f" - {self.warning}"
+        return text
+
+
+def probe(path, observers=()):
+    """ Probe ``path``; each of ``observers`` is also called with every decoded chunk. """
+    try:
+        import numpy as np
+        stream = decode(path)
+        peak = 0.0
+        frames = 0
+
+        def measured(stream):
+            nonlocal peak, frames
+            for chunk in stream:
+                frames += len(chunk)
+                if len(chunk):
+                    peak = max(peak, float(np.abs(chunk).max()))
+                for observe in observers:
+                    observe(chunk)
+                yield chunk
+
+        level = gated_loudness(block_powers(stream.rate, measured(stream)))
+    except ImportError:
+        return check_readable(path, "needs numpy")
+    except NoDecoderError:
+        return check_readable(path, "no decoder for this format")
+    except (AudioError, OSError) as e:
+        return ProbeResult(path, error=str(e))
+
+    duration = frames / stream.rate
+    result = ProbeResult(path, duration, stream.rate, stream.channels,
+                         20 * np.log10(peak) if peak else float("-inf"), level)
+    if duration < MIN_SECONDS:
+        result.error = "the file contains no audio"
+    elif result.peak_db < SILENCE_DBFS:
+        result.error = "the file is silent"
+    elif stream.expected_frames and frames < stream.expected_frames * TRUNCATED_RATIO:
+        result.warning = f"truncated, {stream.expected_frames / stream.rate:.1f} s expected"
+    elif stream.warning:
+        result.warning = f"possibly truncated ({stream.warning})"
+    return result
+
+
+def check_readable(path, reason):
+    """ What can be checked without decoding: the file opens and is not empty. """
+    unchecked = f"not fully checked ({reason})"
+    try:
+        with open(path, "rb") as f:
+            if not f.read(1):
+                return ProbeResult(path, error="the file is empty")
+        if path.lower().endswith(".wav"):
+            with wave.open(path, "rb") as w:
+                rate, channels, frames = w.getframerate(), w.getnchannels(), w.getnframes()
+            if not rate or frames / rate < MIN_SECONDS:
+                return ProbeResult(path, error="the file contains no audio")
+            return ProbeResult(path, frames / rate, rate, channels, warning=unchecked)
+    except (wave.Error, EOFError) as e:
+        return ProbeResult(path, error=f"not a readable WAV file: {e}")
+    except OSError as e:
+        return ProbeResult(path, error=str(e))
+    return ProbeResult(path, warning=unchecked)
+
+
+class Prober:
+    """ Probe paths off the calling thread; only the newest request is kept.
+
+    Each callable in ``warmers`` gets every measured result first, then
+    ``on_result(result)`` is called. Both run on the prober's thread.
+    """
+
+    def __init__(self, on_result, warmers=()):
+        self.on_result = on_result
+        self.warmers = list(warmers)
+        self._pending = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._work, name="alarm-probe", daemon=True)
+        self._thread.start()
+
+    def request(self, path):
+        with self._cond:
+            self._pending = path
+            self._cond.notify()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                path, self._pending = self._pending, None
+            result = probe(path)
+            if result.measured:
+                for warm in self.warmers:
+                    try:
+                        warm(result)
+                    except (AudioError, OSError):
+                        pass
+            with self._cond:
+                # A newer path arrived meanwhile; this result is stale.
+                if self._pending is not None or self._closed:
+                    continue
+            self.on_result(result)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
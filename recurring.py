@@ -0,0 +1,252 @@
+""" Recurring session schedules with cron-style rules.
+
+A rule is a five-field cron expression (minute hour day-of-month month
+day-of-week) interpreted in an IANA timezone, or in the system's local time
+when none is given, plus the plan to start when it fires. Firings are
+expanded lazily: the index holds only the next firing of every rule in a
+min-heap keyed by UTC timestamp, so finding what is due next is O(1) and
+re-arming a rule after it fires is O(log n).
+
+Local times are resolved the way cron does: a time skipped by a DST jump
+fires at the instant of the jump (``30 2 * * *`` in Europe/Berlin fires at
+03:00 on the spring-forward day), and a time repeated when clocks fall
+back fires once, on its first occurrence. Plans are compiled when rules
+are loaded, so a bad one is reported then rather than when it fires.
+"""
+import datetime
+import heapq
+import itertools
+import json
+import threading
+import time
+
+from calendars import tz_database_missing
+from schedule import compile_plan, PlanError
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+_NAMES = {
+    3: {"jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6, "jul": 7, "aug": 8,
+        "sep": 9, "oct": 10, "nov": 11, "dec": 12},
+    4: {"sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6},
+}
+_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+# Searching further than this for a matching day means the rule can never fire.
+MAX_LOOKAHEAD_DAYS = 366 * 8
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _field(text, index):
+    low, high = _RANGES[index]
+    names = _NAMES.get(index, {})
+    values = set()
+    for part in text.lower().split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, stop = low, high
+        else:
+            first, _, last = part.partition("-")
+            start = names[first] if first in names else int(first)
+            stop = (names[last] if last in names else int(last)) if last else (high if step > 1 else start)
+        if not (low <= start <= high and low <= stop <= high) or step < 1:
+            raise RuleError(f"{text!r} is out of range")
+        values.update(range(start, stop + 1, step))
+    if index == 4 and 7 in values:
+        values.discard(7)
+        values.add(0)
+    return sorted(values)
+
+
+class Rule:
+    def __init__(self, cron, plan="", tz=None, name=None):
+        fields = cron.split()
+        if len(fields) != 5:
+            raise RuleError(f"expected 5 cron fields in {cron!r}")
+        self.cron = cron
+        self.plan = plan
+        self.name = name or cron
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _field(text, i) for i, text in enumerate(fields))
+        # Like cron, a restricted day-of-month and day-of-week match either.
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+        if tz and ZoneInfo is None:
+            raise RuleError("named timezones need Python 3.9+")
+        try:
+            self.tz = ZoneInfo(tz) if tz else None
+        except ZoneInfoNotFoundError:
+            if tz_database_missing():
+                raise RuleError(f"unknown timezone {tz!r}: no timezone database found; "
+                                "install the tzdata package") from None
+            raise RuleError(f"unknown timezone {tz!r}") from None
+
+    def _day_matches(self, day):
+        if day.month not in self.months:
+            return False
+        in_days = day.day in self.days
+        in_weekdays = (day.isoweekday() % 7) in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def _local(self, timestamp):
+        if self.tz is None:
+            return datetime.datetime.fromtimestamp(timestamp)
+        return datetime.datetime.fromtimestamp(timestamp, self.tz).replace(tzinfo=None)
+
+    def _offset(self, timestamp):
+        if self.tz is None:
+            return time.localtime(timestamp).tm_gmtoff
+        return datetime.datetime.fromtimestamp(timestamp, self.tz).utcoffset()
+
+    def _timestamp(self, local):
+        if self.tz is None:
+            fires = time.mktime(local.timetuple()[:8] + (-1,))
+        else:
+            fires = local.replace(tzinfo=self.tz, fold=0).timestamp()
+        skipped = (self._local(fires) - local).total_seconds()
+        if not skipped:
+            return fires
+        # ``local`` falls in a DST gap and ``fires`` is that far to one side
+        # of the jump; bisect for the jump itself, where the offset changes.
+        lo, hi = sorted((int(fires), int(fires - skipped)))
+        after = self._offset(hi)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self._offset(mid) == after:
+                hi = mid
+            else:
+                lo = mid
+        return float(hi)
+
+    def next_after(self, timestamp):
+        """ UTC timestamp of the first firing strictly after ``timestamp``, or None. """
+        if self.tz is None:
+            start = datetime.datetime.fromtimestamp(timestamp)
+        else:
+            start = datetime.datetime.fromtimestamp(timestamp, self.tz).replace(tzinfo=None)
+        # A DST gap can map a slightly earlier local day onto a later instant,
+        # so start the scan a day early and filter by timestamp.
+        day = start.date() - datetime.timedelta(days=1)
+        for _ in range(MAX_LOOKAHEAD_DAYS):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        local = datetime.datetime(day.year, day.month, day.day, hour, minute)
+                        fires = self._timestamp(local)
+                        if fires > timestamp:
+                            return fires
+            day += datetime.timedelta(days=1)
+        return None
+
+
+class RecurringIndex:
+    """ Min-heap of the next firing of every rule. """
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self.heap = []
+        self._seq = itertools.count()
+        self.rebuild()
+
+    def rebuild(self, now=None):
+        """ Recompute every rule's next firing, e.g. after the clock or timezone changed. """
+        if now is None:
+            now = time.time()
+        self.heap = []
+        for rule in self.rules:
+            self._push(rule, now)
+
+    def _push(self, rule, after):
+        fires = rule.next_after(after)
+        if fires is not None:
+            heapq.heappush(self.heap, (fires, next(self._seq), rule))
+
+    def add(self, rule, now=None):
+        self.rules.append(rule)
+        self._push(rule, time.time() if now is None else now)
+
+    def next_time(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now=None):
+        """ Rules due at ``now``, each re-armed for its following firing. """
+        if now is None:
+            now = time.time()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fires, _, rule = heapq.heappop(self.heap)
+            due.append(rule)
+            self._push(rule, max(fires, now))
+        return due
+
+
+def _zone_signature():
+    local = time.localtime()
+    return local.tm_gmtoff, local.tm_zone
+
+
+class RecurringRunner:
+    """ Sleeps until the next firing and calls ``on_fire(rule)`` from its thread.
+
+    Sleeps are capped at ``recheck`` seconds; on waking, the index is rebuilt
+    if the wall clock moved differently from the monotonic clock or the local
+    UTC offset changed, which covers manual clock changes and timezone moves.
+    """
+
+    def __init__(self, index, on_fire, recheck=60.0):
+        self.index = index
+        self.on_fire = on_fire
+        self.recheck = recheck
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="recurring", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        zone = _zone_signature()
+        while not self._stop.is_set():
+            wall, mono = time.time(), time.monotonic()
+            next_time = self.index.next_time()
+            timeout = self.recheck if next_time is None else min(self.recheck, max(0.0, next_time - wall))
+            if self._stop.wait(timeout):
+                return
+            wall_now = time.time()
+            drift = (wall_now - wall) - (time.monotonic() - mono)
+            if abs(drift) > 1.0:
+                # The clock was set: skip whatever the jump stepped over.
+                zone = _zone_signature()
+                self.index.rebuild(wall_now)
+                continue
+            if _zone_signature() != zone:
+                zone = _zone_signature()
+                self.index.rebuild(wall)
+            for rule in self.index.pop_due(wall_now):
+                self.on_fire(rule)
+
+
+def load_rules(path):
+    """ Rules from a JSON list of ``{"cron", "plan", "tz", "name"}`` objects. """
+    with open(path) as f:
+        entries = json.load(f)
+    rules = [Rule(entry["cron"], entry.get("plan", ""), entry.get("tz"), entry.get("name"))
+             for entry in entries]
+    for rule in rules:
+        if rule.plan:
+            try:
+                compile_plan(rule.plan)
+            except PlanError as e:
+                raise RuleError(f"{rule.name}: invalid plan: {e}") from None
+    return rules
@@ -0,0 +1,157 @@
+""" Multi-phase schedule plans compiled to a timeline of offsets.
+
+A plan is written as a comma separated list of phases, with ``N x (...)``
+for repetition, optionally followed by ``; once`` or ``; until HH:MM``::
+
+    4 x (50 study, 10 break), 30 long break; until 18:00
+
+Durations are minutes. Plans repeat forever unless told otherwise. The
+compiled plan stores the start offset of every phase in one cycle, so the
+phase in effect at any elapsed time is a ``divmod`` plus a binary search.
+"""
+import datetime
+import re
+from bisect import bisect_right
+
+from engine import STUDY, BREAK, LONG_BREAK
+
+_TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d+)?)|([x×*(),])|([A-Za-z]+))")
+_KINDS = {"study": STUDY, "s": STUDY, "break": BREAK, "b": BREAK, "long": LONG_BREAK,
+          "l": LONG_BREAK}
+# Repetition is expanded into a list, so a short text could otherwise ask
+# for billions of phases.
+MAX_PHASES = 10000
+
+
+class PlanError(ValueError):
+    pass
+
+
+class Plan:
+    def __init__(self, phases, repeat=True, end=None):
+        """ ``phases`` is a sequence of ``(kind, seconds)``; ``end`` caps the
+        total length in seconds. """
+        self.phases = tuple((kind, float(seconds)) for kind, seconds in phases if seconds > 0)
+        if not self.phases:
+            raise PlanError("plan has no phases")
+        self.repeat = repeat
+        self.end = end
+        self.offsets = []
+        total = 0.0
+        for _, seconds in self.phases:
+            self.offsets.append(total)
+            total += seconds
+        self.cycle = total
+
+    def locate(self, elapsed):
+        """ ``(index, kind, start, end)`` of the phase in effect ``elapsed``
+        seconds after the plan started, or None once the plan is over.
+        ``index`` counts phases across cycles. """
+        if elapsed < 0:
+            elapsed = 0.0
+        if self.end is not None and elapsed >= self.end:
+            return None
+        cycle, within = divmod(elapsed, self.cycle)
+        if cycle and not self.repeat:
+            return None
+        i = bisect_right(self.offsets, within) - 1
+        kind, seconds = self.phases[i]
+        start = cycle * self.cycle + self.offsets[i]
+        end = start + seconds
+        if self.end is not None and end > self.end:
+            end = self.end
+        return int(cycle) * len(self.phases) + i, kind, start, end
+
+
+def simple_plan(study_seconds, break_seconds):
+    return Plan([(STUDY, study_seconds), (BREAK, break_seconds)])
+
+
+def _tokens(text):
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise PlanError(f"unexpected text at {text[pos:]!r}")
+        pos = match.end()
+        number, symbol, word = match.groups()
+        if number is not None:
+            yield "num", float(number)
+        elif symbol is not None:
+            yield "sym", "x" if symbol in "x×*" else symbol
+        else:
+            yield "word", word.lower()
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = list(_tokens(text))
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1] != value):
+            raise PlanError(f"expected {value or kind}, got {token[1]!r}")
+        self.pos += 1
+        return token[1]
+
+    def items(self):
+        phases = self.item()
+        while self.peek() == ("sym", ","):
+            self.take()
+            phases += self.item()
+            if len(phases) > MAX_PHASES:
+                raise PlanError(f"plan has more than {MAX_PHASES} phases")
+        return phases
+
+    def item(self):
+        number = self.take("num")
+        if self.peek() == ("sym", "x"):
+            self.take()
+            self.take("sym", "(")
+            inner = self.items()
+            self.take("sym", ")")
+            if number * len(inner) > MAX_PHASES:
+                raise PlanError(f"plan has more than {MAX_PHASES} phases")
+            return inner * int(number)
+        word = self.take("word")
+        if word not in _KINDS:
+            raise PlanError(f"unknown phase {word!r}")
+        if word == "long" and self.peek() == ("word", "break"):
+            self.take()
+        return [(_KINDS[word], number * 60)]
+
+    def parse(self):
+        phases = self.items()
+        if self.pos != len(self.tokens):
+            raise PlanError(f"unexpected {self.peek()[1]!r}")
+        return phases
+
+
+def compile_plan(text, now=None):
+    """ Parse ``text`` into a Plan starting at ``now`` (a local datetime). """
+    body, _, options = text.partition(";")
+    phases = _Parser(body).parse()
+    repeat, end = True, None
+    option = options.strip().lower()
+    if option == "once":
+        repeat = False
+    elif option.startswith("until"):
+        match = re.fullmatch(r"until\s+(\d{1,2}):(\d{2})", option)
+        if not match:
+            raise PlanError(f"bad end time {option!r}")
+        hour, minute = int(match.group(1)), int(match.group(2))
+        if hour > 23 or minute > 59:
+            raise PlanError(f"bad end time {option!r}; use 00:00 to 23:59")
+        now = now or datetime.datetime.now()
+        until = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if until <= now:
+            until += datetime.timedelta(days=1)
+        end = (until - now).total_seconds()
+    elif option:
+        raise PlanError(f"unknown option {option!r}")
+    return Plan(phases, repeat=repeat, end=end)
@@ -0,0 +1,212 @@
+""" Headless timer service hosting many study/break sessions.
+
+Clients speak line-delimited JSON over TCP or a Unix socket::
+
+    {"op": "start", "session": "room-1", "study": 1500, "break": 600}
+    {"op": "start", "session": "room-2", "plan": "4 x (50 study, 10 break), 30 long break"}
+    {"op": "subscribe", "session": "room-1"}
+    {"op": "unsubscribe", "session": "room-1"}
+    {"op": "stop", "session": "room-1"}
+
+Subscribers receive one line per transition::
+
+    {"event": "phase", "session": "room-1", "phase": "break",
+     "started": 1699999400.0, "deadline": 1700000000.0}
+
+``started`` and ``deadline`` are the wall-clock (epoch) times at which the
+phase began and will end. Every
+session is a PhaseEngine driven by the event loop clock, and all of them
+share one heap and one armed timer, so idle sessions cost nothing.
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import time
+
+from engine import PhaseEngine
+from schedule import compile_plan, simple_plan, PlanError
+
+# Subscribers whose unsent output grows past this are disconnected rather
+# than being allowed to buffer without bound.
+MAX_PENDING_BYTES = 64 * 1024
+
+
+class Session:
+    def __init__(self, name, clock):
+        self.name = name
+        self.engine = PhaseEngine(clock=clock)
+        self.subscribers = set()
+        self.generation = 0
+
+
+class TimerServer:
+    def __init__(self, loop):
+        self.loop = loop
+        self.sessions = {}
+        self.heap = []
+        self._seq = itertools.count()
+        self._handle = None
+        self._armed_for = None
+        # Offset from the loop's monotonic clock to wall-clock time.
+        self.wall_offset = time.time() - self.loop.time()
+
+    def start_session(self, name, plan):
+        session = self.sessions.get(name)
+        if session is None:
+            session = self.sessions[name] = Session(name, self.loop.time)
+        session.generation += 1
+        _, deadline = session.engine.start_plan(plan)
+        self._schedule(session, deadline)
+        self.publish(session)
+        return session
+
+    def stop_session(self, name):
+        session = self.sessions.pop(name, None)
+        if session is not None:
+            # Heap entries for this generation are skipped when they come due.
+            session.generation += 1
+            session.engine.clear()
+            self.publish(session)
+
+    def _schedule(self, session, deadline, arm=True):
+        heapq.heappush(self.heap, (deadline, next(self._seq), session, session.generation))
+        if arm:
+            self._arm()
+
+    def _arm(self):
+        if not self.heap:
+            return
+        deadline = self.heap[0][0]
+        if self._armed_for is not None and self._armed_for <= deadline:
+            return
+        if self._handle is not None:
+            self._handle.cancel()
+        self._armed_for = deadline
+        self._handle = self.loop.call_at(deadline, self._fire)
+
+    def _fire(self):
+        self._handle = None
+        self._armed_for = None
+        now = self.loop.time()
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            _, _, session, generation = heapq.heappop(heap)
+            if generation != session.generation or session.engine.state is None:
+                continue
+            state = session.engine.advance(now)
+            if state is None:
+                self.sessions.pop(session.name, None)
+            else:
+                self._schedule(session, state[1], arm=False)
+            self.publish(session)
+        self._arm()
+
+    def message(self, session):
+        state = session.engine.state
+        if state is None:
+            return {"event": "stopped", "session": session.name}
+        phase, deadline = state
+        return {"event": "phase", "session": session.name, "phase": phase,
+                "started": session.engine.started + self.wall_offset,
+                "deadline": deadline + self.wall_offset}
+
+    def publish(self, session):
+        if not session.subscribers:
+            return
+        line = (json.dumps(self.message(session)) + "\n").encode()
+        for writer in list(session.subscribers):
+            if writer.transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+                session.subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    async def handle_client(self, reader, writer):
+        subscribed = []
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than the stream limit; the reader has dropped it.
+                    writer.write(b'{"event": "error", "error": "request too long"}\n')
+                    continue
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request["op"]
+                    name = request["session"]
+                    if not isinstance(op, str) or not isinstance(name, str):
+                        raise TypeError("op and session must be strings")
+                except (ValueError, KeyError, TypeError):
+                    writer.write(b'{"event": "error", "error": "bad request"}\n')
+                    continue
+                if op == "start":
+                    try:
+                        if "plan" in request:
+                            if not isinstance(request["plan"], str):
+                                raise PlanError("plan must be a string")
+                            plan = compile_plan(request["plan"])
+                        else:
+                            study = float(request.get("study", 1500))
+                            pause = float(request.get("break", 600))
+                            if not (math.isfinite(study) and math.isfinite(pause)):
+                                raise PlanError("study and break must be finite")
+                            plan = simple_plan(study, pause)
+                    except (PlanError, ValueError, TypeError) as e:
+                        writer.write((json.dumps({"event": "error", "error": str(e)}) + "\n").encode())
+                        continue
+                    self.start_session(name, plan)
+                elif op == "stop":
+                    self.stop_session(name)
+                elif op == "subscribe":
+                    session = self.sessions.get(name)
+                    if session is None:
+                        writer.write(b'{"event": "error", "error": "no such session"}\n')
+                        continue
+                    session.subscribers.add(writer)
+                    subscribed.append(session)
+                    writer.write((json.dumps(self.message(session)) + "\n").encode())
+                elif op == "unsubscribe":
+                    session = self.sessions.get(name)
+                    if session is not None:
+                        session.subscribers.discard(writer)
+        except ConnectionError:
+            pass
+        finally:
+            for session in subscribed:
+                session.subscribers.discard(writer)
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, unix_path=None, ready=None):
+    server = TimerServer(asyncio.get_running_loop())
+    if unix_path:
+        listener = await asyncio.start_unix_server(server.handle_client, path=unix_path, limit=4096)
+    else:
+        listener = await asyncio.start_server(server.handle_client, host, port, limit=4096,
+                                              backlog=4096)
+    if ready is not None:
+        ready.set_result(listener)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-session study/break timer server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+""" Where the app keeps caches that can always be rebuilt. """
+import json
+import os
+import sys
+
+APP_NAME = "StudyBreakTimer"
+
+
+def cache_dir(*parts):
+    """ The per-user cache directory (joined with ``parts``), created on demand. """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+        path = os.path.join(base, APP_NAME, "Cache")
+    elif sys.platform == "darwin":
+        path = os.path.join(os.path.expanduser("~/Library/Caches"), APP_NAME)
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        path = os.path.join(base, APP_NAME.lower())
+    path = os.path.join(path, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_json(path, default=None):
+    """ Load a cache file; a missing or corrupt one is just an empty cache. """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path, data):
+    # Replaced atomically so a crash never leaves half a cache behind.
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
@@ -0,0 +1,133 @@
+""" Waveform thumbnails for alarm sounds.
+
+While a file is decoded, ``Accumulator`` keeps the minimum and maximum of
+every ``BUCKET`` frames (a few kilobytes for a whole song), and ``finish``
+folds those down to the requested number of columns. Thumbnails are stored
+as small binary files in the user cache directory, next to the other audio
+caches, stamped with the source file's mtime and size. ``load`` reads one
+back without decoding anything, or returns None if the file has changed
+since. Reading and drawing need no NumPy; only computing does.
+"""
+import hashlib
+import os
+import struct
+
+import storage
+from decode import decode
+
+WIDTH = 240
+BUCKET = 256
+_HEADER = struct.Struct("<4sqqH")
+_MAGIC = b"WFT1"
+
+
+class Accumulator:
+    """ Per-bucket min/max of a stream of (frames, channels) chunks. """
+
+    def __init__(self, bucket=BUCKET):
+        import numpy as np
+        self.np = np
+        self.bucket = bucket
+        self.mins = []
+        self.maxs = []
+        self._carry = None
+
+    def add(self, chunk):
+        np = self.np
+        # Channels are folded together; the thumbnail shows the envelope of all.
+        lows = chunk.min(axis=1)
+        highs = chunk.max(axis=1)
+        if self._carry is not None:
+            lows = np.concatenate((self._carry[0], lows))
+            highs = np.concatenate((self._carry[1], highs))
+        usable = len(lows) - len(lows) % self.bucket
+        if usable:
+            self.mins.append(lows[:usable].reshape(-1, self.bucket).min(axis=1))
+            self.maxs.append(highs[:usable].reshape(-1, self.bucket).max(axis=1))
+        self._carry = (lows[usable:], highs[usable:])
+
+    def finish(self, width=WIDTH):
+        """ (mins, maxs) as bytes of signed 8-bit values, ``width`` columns or fewer. """
+        np = self.np
+        mins, maxs = list(self.mins), list(self.maxs)
+        if self._carry is not None and len(self._carry[0]):
+            mins.append(self._carry[0].min(keepdims=True))
+            maxs.append(self._carry[1].max(keepdims=True))
+        if not mins:
+            return b"", b""
+        mins, maxs = np.concatenate(mins), np.concatenate(maxs)
+        if len(mins) > width:
+            edges = np.linspace(0, len(mins), width + 1).astype(np.intp)[:-1]
+            mins = np.minimum.reduceat(mins, edges)
+            maxs = np.maximum.reduceat(maxs, edges)
+
+        def to_bytes(values):
+            return np.clip(np.round(values * 127), -127, 127).astype(np.int8).tobytes()
+        return to_bytes(mins), to_bytes(maxs)
+
+
+def cache_path(path):
+    name = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=16).hexdigest()
+    return os.path.join(storage.cache_dir("thumbnails"), name + ".wft")
+
+
+def store(path, mins, maxs, st=None):
+    st = st or os.stat(path)
+    target = cache_path(path)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, st.st_mtime_ns, st.st_size, len(mins)))
+        f.write(mins)
+        f.write(maxs)
+    os.replace(tmp, target)
+
+
+def load(path):
+    """ Cached (mins, maxs) for ``path``, or None if missing or out of date. """
+    try:
+        st = os.stat(path)
+        with open(cache_path(path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, mtime_ns, size, count = _HEADER.unpack_from(data)
+    if magic != _MAGIC or (mtime_ns, size) != (st.st_mtime_ns, st.st_size) \
+            or len(data) != _HEADER.size + 2 * count:
+        return None
+    body = data[_HEADER.size:]
+    return body[:count], body[count:]
+
+
+def render(path, width=WIDTH):
+    """ Cached thumbnail for ``path``, decoding and storing it if needed. """
+    cached = load(path)
+    if cached is not None:
+        return cached
+    st = os.stat(path)
+    accumulator = Accumulator()
+    for chunk in decode(path):
+        accumulator.add(chunk)
+    mins, maxs = accumulator.finish(width)
+    store(path, mins, maxs, st)
+    return mins, maxs
+
+
+def draw(canvas, thumbnail, fill="steelblue"):
+    """ Draw ``thumbnail`` across ``canvas`` as a single polygon. """
+    canvas.delete("waveform")
+    if not thumbnail or not thumbnail[0]:
+        return
+    mins, maxs = (struct.unpack(f"{len(part)}b", part) for part in thumbnail)
+    width = canvas.winfo_width()
+    if width <= 1:
+        # Not laid out yet.
+        width = int(canvas["width"])
+    height = int(canvas["height"])
+    middle = height / 2
+    scale = (height / 2 - 1) / 127
+    step = width / len(mins)
+    top = [(i * step, middle - high * scale) for i, high in enumerate(maxs)]
+    bottom = [(i * step, middle - low * scale) for i, low in reversed(list(enumerate(mins)))]
+    canvas.create_polygon(top + bottom, fill=fill, outline=fill, tags="waveform")
@@ -0,0 +1,122 @@
+""" Span and instant-event tracing into a fixed-size ring buffer.
+
+Events are written as Chrome trace-event JSON (chrome://tracing, Perfetto).
+Tracing is off by default; while off, ``span`` returns a shared no-op
+context manager and ``instant`` returns immediately.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+
+_enabled = False
+_buffer = []
+_capacity = 0
+_counter = itertools.count()
+_origin = time.perf_counter_ns()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "cat", "start")
+
+    def __init__(self, name, cat):
+        self.name = name
+        self.cat = cat
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        _record("X", self.name, self.cat, self.start, end - self.start)
+        return False
+
+
+def _record(ph, name, cat, ts, dur):
+    # next() on itertools.count is atomic under the GIL, so concurrent writers
+    # never share a slot until the buffer wraps around.
+    slot = next(_counter) % _capacity
+    _buffer[slot] = (ph, name, cat, ts, dur, threading.get_ident())
+
+
+def enable(capacity=65536):
+    global _enabled, _buffer, _capacity, _counter
+    _buffer = [None] * capacity
+    _capacity = capacity
+    _counter = itertools.count()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+def span(name, cat="app"):
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, cat)
+
+
+def instant(name, cat="app"):
+    if _enabled:
+        _record("i", name, cat, time.perf_counter_ns(), 0)
+
+
+def wrap(name, callback, cat="ui"):
+    """ Trace every call of ``callback``; returns it unchanged when tracing is off. """
+    if not _enabled:
+        return callback
+
+    def traced(*args, **kwargs):
+        with _Span(name, cat):
+            return callback(*args, **kwargs)
+    return traced
+
+
+def events():
+    """ Recorded events in chronological order as trace-event dicts. """
+    if not _capacity:
+        return []
+    pid = os.getpid()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    out = []
+    recorded = [e for e in list(_buffer) if e is not None]
+    recorded.sort(key=lambda e: e[3])
+    for ph, name, cat, ts, dur, tid in recorded:
+        event = {"name": name, "cat": cat, "ph": ph, "pid": pid, "tid": tid,
+                 "ts": (ts - _origin) / 1000}
+        if ph == "X":
+            event["dur"] = dur / 1000
+        else:
+            event["s"] = "t"
+        out.append(event)
+    for tid in {e["tid"] for e in out}:
+        if tid in names:
+            out.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                        "args": {"name": names[tid]}})
+    return out
+
+
+def dump(path):
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events(), "displayTimeUnit": "ms"}, f)